@@ -1,12 +1,13 @@
 import base64
 import io
-import json
 import os
-import re
+from typing import Literal
 from PIL import Image
 from pdf2image import convert_from_bytes
 from openai import OpenAI
 from dotenv import load_dotenv
+from pydantic import BaseModel, ConfigDict, TypeAdapter
+from utils.http_client import get_sync_http_client
 
 # Cargar variables de entorno desde .env
 load_dotenv()
@@ -16,8 +17,37 @@ api_key = os.getenv("OPENAI_API_KEY")
 if not api_key:
     raise ValueError("No se encontró la variable OPENAI_API_KEY en el entorno")
 
-# Cliente de OpenAI con clave explícita
-client = OpenAI(api_key=api_key)
+# Cliente de OpenAI con clave explícita y pool de conexiones keep-alive
+client = OpenAI(api_key=api_key, http_client=get_sync_http_client())
+
+
+# Esquema de la respuesta; el modelo queda restringido a él (structured outputs)
+class CamposDocumento(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
+    nombres: str
+    apellidos: str
+    numero_documento: str
+    fecha_nacimiento: str
+    fecha_expedicion: str
+    sexo: str
+    grupo_sanguineo: str
+    lugar_nacimiento: str
+    estatura: str
+
+
+class DocumentoIdentidad(BaseModel):
+    model_config = ConfigDict(extra="forbid")
+
+    tipo: Literal["cedula", "pasaporte"]
+    campos: CamposDocumento
+
+
+documento_adapter = TypeAdapter(DocumentoIdentidad)
+RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {"name": "documento_identidad", "strict": True, "schema": documento_adapter.json_schema()}
+}
 
 def extract_info_from_base64(base64_str):
     # Decodificar base64
@@ -54,23 +84,7 @@ def extract_info_from_base64(base64_str):
     # Instrucciones para GPT
     prompt = """
 Eres un sistema de lectura de documentos de identidad (cédula o pasaporte).
-Extrae los siguientes campos y devuélvelos en un JSON como este:
-
-{
-  "tipo": "cedula" o "pasaporte",
-  "campos": {
-    "nombres": "...",
-    "apellidos": "...",
-    "numero_documento": "...",
-    "fecha_nacimiento": "...",
-    "fecha_expedicion": "...",
-    "sexo": "...",
-    "grupo_sanguineo": "...",
-    "lugar_nacimiento": "...",
-    "estatura": "..."
-  }
-}
-
+Extrae el tipo de documento ("cedula" o "pasaporte") y sus campos en JSON.
 Si no se puede determinar algún campo, déjalo vacío.
     """
 
@@ -81,25 +95,16 @@ Si no se puede determinar algún campo, déjalo vacío.
             {"role": "system", "content": prompt},
             {"role": "user", "content": image_payloads}
         ],
-        max_tokens=800
+        max_tokens=800,
+        response_format=RESPONSE_FORMAT
     )
 
-    content = response.choices[0].message.content.strip()
+    message = response.choices[0].message
+    if message.refusal:
+        raise ValueError("OpenAI rechazó la solicitud: " + message.refusal)
 
-    # Sanitización del resultado
-    cleaned = clean_code_block(content)
-    formatted = format_dict_keys_and_values(cleaned)
+    # Validación directa contra el esquema (sin reescribir el texto de la respuesta)
     try:
-        result = json.loads(formatted)
-        return result
+        return documento_adapter.validate_json(message.content or "").model_dump()
     except Exception:
-        raise ValueError("La respuesta de OpenAI no fue un JSON válido:\n" + content)
-
-# Helpers
-def clean_code_block(text):
-    return re.sub(r'```[a-zA-Z]*', '', text).replace('```', '').strip()
-
-def format_dict_keys_and_values(text):
-    text = text.replace("dict(", "{").replace(")", "}")
-    text = re.sub(r'(\w+)=', r'"\1":', text)
-    return text
+        raise ValueError("La respuesta de OpenAI no fue un JSON válido:\n" + (message.content or ""))
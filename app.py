@@ -1,107 +1,220 @@
-from fastapi import FastAPI
-from pydantic import BaseModel
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, File, Form, UploadFile
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel, ValidationError as OptionsError
 import base64
-import uuid
+import binascii
+import json
 import os
-from src.utils.ocr_openai import extract_text_and_fields_with_openai
-from src.utils.parser import extract_entities
-from src.extractor.model import save_to_database
+from src.config import settings
+from src.extractor.jobs import JobWorkerPool, enqueue_job, get_job
+from src.extractor.pipeline import document_flight, estimate_document, process_document
+from src.extractor.schema import ExtractionOptions
+from src.utils.cache import cache_stats
+from src.utils.metrics import metrics
+from src.utils.resilience import ocr_resilience
+from src.utils.scheduler import openai_scheduler
+from src.utils.http_client import close_http_clients, warm_up_connections
+from src.utils.ocr_openai import OCRExtractionError, get_openai_client, ocr_batcher, ocr_breaker
+from src.utils.image_processing import shutdown_cpu_pool, start_cpu_pool
+from src.utils.validators import ValidationError
 from typing import List, Optional
-from pdf2image import convert_from_bytes
-from PIL import Image
-import io
 
-app = FastAPI()
 
-class DocumentRequest(BaseModel):
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Pool de procesos precalentado para rasterización y re-codificación de imágenes
+    start_cpu_pool()
+    # Conexiones TLS al proveedor abiertas antes de recibir tráfico
+    await warm_up_connections(get_openai_client())
+    # Workers que drenan la cola durable de /jobs
+    app.state.job_workers = JobWorkerPool(run_job)
+    app.state.job_workers.start()
+    yield
+    await app.state.job_workers.stop()
+    await close_http_clients()
+    shutdown_cpu_pool()
+
+
+app = FastAPI(lifespan=lifespan)
+
+class DocumentRequest(ExtractionOptions):
     filename: str
     file_base64: Optional[str] = None  # Para compatibilidad con requests antiguos
     files_base64: Optional[List[str]] = None  # Para múltiples imágenes (frente y respaldo)
 
-# Utilidad para PDF
-def get_images_base64_from_pdf(pdf_bytes: bytes) -> List[str]:
-    images = convert_from_bytes(pdf_bytes)
-    if len(images) > 2:
-        raise ValueError("El PDF debe tener máximo 2 páginas: frente y respaldo.")
-    base64_list = []
-    for img in images:
-        img_byte_arr = io.BytesIO()
-        img.save(img_byte_arr, format='JPEG')
-        base64_list.append(base64.b64encode(img_byte_arr.getvalue()).decode())
-    return base64_list
-
-def get_image_base64_from_image(image_bytes: bytes) -> str:
-    img = Image.open(io.BytesIO(image_bytes))
-    img_byte_arr = io.BytesIO()
-    img = img.convert('RGB')
-    img.save(img_byte_arr, format='JPEG')
-    return base64.b64encode(img_byte_arr.getvalue()).decode()
+class BatchRequest(BaseModel):
+    documents: List[DocumentRequest]
+    concurrency: Optional[int] = None  # Por defecto settings.BATCH_CONCURRENCY
 
-@app.post("/extract")
-async def extract_info(doc: DocumentRequest):
-    # Detecta extensión
-    ext = os.path.splitext(doc.filename)[1].lower()
-    all_images_base64 = []
 
+def decode_request_files(doc: DocumentRequest) -> List[bytes]:
+    """Decodifica el base64 de la solicitud una única vez"""
+    ext = os.path.splitext(doc.filename)[1].lower()
     if ext == '.pdf':
         if not doc.file_base64:
-            return {"error": "El campo file_base64 es obligatorio para archivos PDF."}
-        file_bytes = base64.b64decode(doc.file_base64)
-        try:
-            all_images_base64 = get_images_base64_from_pdf(file_bytes)
-        except ValueError as e:
-            return {"error": str(e)}
-    elif ext in ['.png', '.jpg', '.jpeg']:
-        # Soporta lista de imágenes o una sola
-        if doc.files_base64:
-            for img_b64 in doc.files_base64:
-                img_bytes = base64.b64decode(img_b64)
-                all_images_base64.append(get_image_base64_from_image(img_bytes))
-        elif doc.file_base64:
-            img_bytes = base64.b64decode(doc.file_base64)
-            all_images_base64.append(get_image_base64_from_image(img_bytes))
-        else:
-            return {"error": "Debes enviar al menos una imagen en base64."}
+            raise ValidationError("El campo file_base64 es obligatorio para archivos PDF.")
+        encoded = [doc.file_base64]
     else:
-        return {"error": "Formato de archivo no soportado. Usa PDF, PNG o JPG."}
+        # Soporta lista de imágenes o una sola
+        encoded = doc.files_base64 or ([doc.file_base64] if doc.file_base64 else [])
+        if not encoded:
+            raise ValidationError("Debes enviar al menos una imagen en base64.")
+    try:
+        return [base64.b64decode(item) for item in encoded]
+    except (binascii.Error, ValueError):
+        raise ValidationError("Invalid base64 format")
 
-    # Guarda los archivos originales (opcional)
-    os.makedirs("uploads", exist_ok=True)
-    if ext == '.pdf':
-        if not doc.file_base64:
-            return {"error": "El campo file_base64 es obligatorio para archivos PDF."}
-        filepath = f"uploads/{uuid.uuid4()}_{doc.filename}"
-        with open(filepath, "wb") as f:
-            f.write(base64.b64decode(doc.file_base64))
-    else:
-        for idx, img_b64 in enumerate(all_images_base64):
-            filepath = f"uploads/{uuid.uuid4()}_{idx}_{doc.filename}"
-            with open(filepath, "wb") as f:
-                f.write(base64.b64decode(img_b64))
-
-    # OCR + Extraction para todas las caras
-    full_text = ""
-    ocr_results = []
-    for img_b64 in all_images_base64:
-        result = extract_text_and_fields_with_openai(img_b64)
-        ocr_results.append(result)
-        full_text += (result.get("texto_legible") or "") + "\n"
-    # Combina todos los resultados para la extracción de entidades
-    entities = extract_entities(full_text, raw_data=ocr_results[0] if ocr_results else {})
-
-    # Validación de legibilidad
-    advertencias = []
-    if not full_text or len(full_text.strip()) < 10:
-        advertencias.append("Advertencia: El texto extraído es muy corto o ilegible. Verifique la calidad de la imagen.")
-    if "advertencia_tipo_documento" in entities:
-        advertencias.append(entities["advertencia_tipo_documento"])
-
-    # Save to DB
-    save_to_database(entities, full_text)
 
+def options_from_request(doc: DocumentRequest) -> ExtractionOptions:
+    return ExtractionOptions(**doc.model_dump(include=set(ExtractionOptions.model_fields)))
+
+
+async def run_extraction(filename: str, files: List[bytes], options: Optional[ExtractionOptions] = None) -> dict:
+    try:
+        return await process_document(filename, files, options)
+    except ValidationError as e:
+        return {"error": str(e)}
+    except OCRExtractionError as e:
+        return {"error": str(e), "detalles": e.failures}
+
+
+async def run_job(filename: str, files: List[bytes], options: Optional[ExtractionOptions] = None) -> dict:
+    """Como run_extraction, pero los errores de OCR se propagan para que el job se reintente"""
+    try:
+        return await process_document(filename, files, options)
+    except ValidationError as e:
+        return {"error": str(e)}
+
+
+async def extract_from_request(doc: DocumentRequest) -> dict:
+    try:
+        files = decode_request_files(doc)
+    except ValidationError as e:
+        return {"error": str(e)}
+    return await run_extraction(doc.filename, files, options_from_request(doc))
+
+
+@app.post("/extract")
+async def extract_info(doc: DocumentRequest):
+    return await extract_from_request(doc)
+
+
+@app.post("/extract/upload")
+async def extract_info_upload(
+    file: Optional[UploadFile] = File(None),
+    front: Optional[UploadFile] = File(None),
+    back: Optional[UploadFile] = File(None),
+    filename: Optional[str] = Form(None),
+    ocr_mode: Optional[str] = Form(None),
+    tipo_documento: Optional[str] = Form(None),
+    fields: Optional[str] = Form(None),
+    fields_only: Optional[bool] = Form(None),
+):
+    """
+    Variante multipart/form-data de /extract: recibe el documento en binario
+    (`file` para PDF o imagen única, o `front`/`back`) sin la sobrecarga del base64.
+    `fields` es una lista de campos separada por comas.
+    Starlette ya vuelca cada parte a un SpooledTemporaryFile mientras la recibe.
+    """
+    parts = [part for part in (file, front, back) if part is not None]
+    if not parts:
+        return {"error": "Debes enviar el archivo en `file` o las caras en `front`/`back`."}
+    filename = filename or parts[0].filename or ""
+    try:
+        options = ExtractionOptions(
+            ocr_mode=ocr_mode,
+            tipo_documento=tipo_documento,
+            fields=[field.strip() for field in fields.split(",") if field.strip()] if fields else None,
+            fields_only=fields_only
+        )
+    except OptionsError as e:
+        return {"error": f"Opciones de extracción no válidas: {e.errors()[0]['msg']}"}
+    files = []
+    for part in parts:
+        if part.size is not None and part.size > settings.MAX_FILE_SIZE:
+            return {"error": f"El archivo supera el tamaño máximo ({settings.MAX_FILE_SIZE} bytes)."}
+        files.append(await part.read())
+        await part.close()
+    return await run_extraction(filename, files, options)
+
+
+@app.post("/extract/estimate")
+async def estimate_extraction(doc: DocumentRequest):
+    """
+    Dry-run de /extract: preprocesa el documento y devuelve la estimación local
+    de tokens, coste y latencia para OPENAI_MODEL sin llamar al OCR.
+    """
+    try:
+        files = decode_request_files(doc)
+        return await estimate_document(doc.filename, files, options_from_request(doc))
+    except ValidationError as e:
+        return {"error": str(e)}
+
+
+@app.post("/extract/batch")
+async def extract_batch(batch: BatchRequest):
+    """
+    Procesa una lista de documentos con concurrencia acotada y devuelve una
+    línea NDJSON por documento a medida que cada uno termina.
+    """
+    if len(batch.documents) > settings.BATCH_MAX_DOCUMENTS:
+        return {"error": f"El lote supera el máximo de {settings.BATCH_MAX_DOCUMENTS} documentos."}
+    concurrency = max(1, min(batch.concurrency or settings.BATCH_CONCURRENCY, settings.BATCH_CONCURRENCY))
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run_one(index: int, doc: DocumentRequest) -> dict:
+        async with semaphore:
+            try:
+                result = await extract_from_request(doc)
+            except Exception as e:
+                result = {"error": f"{type(e).__name__}: {e}"}
+        return {"index": index, "filename": doc.filename, **result}
+
+    async def stream_results():
+        tasks = [asyncio.create_task(run_one(i, doc)) for i, doc in enumerate(batch.documents)]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                result = await next_done
+                yield json.dumps(result, ensure_ascii=False, default=str) + "\n"
+        finally:
+            # Si el cliente se desconecta, no seguimos gastando llamadas de OCR
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson")
+
+
+@app.get("/metrics")
+async def get_metrics():
+    """Contadores internos de rendimiento (caché, coalescencia, modos de OCR, etc.)"""
     return {
-        "tipo_documento": entities.get("tipo_documento", "Desconocido"),
-        "texto_legible": full_text,
-        "datos": entities,
-        "advertencias": advertencias if advertencias else None
+        **metrics.snapshot(),
+        "cache": cache_stats(),
+        "coalescing": document_flight.stats(),
+        "scheduler": openai_scheduler.stats(),
+        "resilience": ocr_resilience.stats(),
+        "circuit_breaker": ocr_breaker.stats(),
+        "micro_batching": ocr_batcher.stats() if ocr_batcher is not None else None
     }
+
+
+@app.post("/jobs", status_code=202)
+async def submit_job(doc: DocumentRequest):
+    """Encola el documento y devuelve el id del job inmediatamente"""
+    try:
+        files = decode_request_files(doc)
+    except ValidationError as e:
+        return JSONResponse(status_code=400, content={"error": str(e)})
+    job_id = await asyncio.to_thread(enqueue_job, doc.filename, files, options_from_request(doc).model_dump())
+    app.state.job_workers.notify()
+    return {"job_id": job_id, "status": "queued"}
+
+
+@app.get("/jobs/{job_id}")
+async def get_job_status(job_id: str):
+    job = await asyncio.to_thread(get_job, job_id)
+    if job is None:
+        return JSONResponse(status_code=404, content={"error": "Job no encontrado."})
+    return job
@@ -18,6 +18,37 @@ class Settings(BaseSettings):
     OPENAI_API_KEY: str = os.getenv('OPENAI_API_KEY', '')
     OPENAI_MODEL: str = os.getenv('OPENAI_MODEL', 'gpt-4o-mini')
     OPENAI_MAX_TOKENS: int = int(os.getenv('OPENAI_MAX_TOKENS', '1200'))
+    OCR_MODE: str = os.getenv('OCR_MODE', 'per_side')  # per_side | combined | composite | field_groups
+    OCR_STRUCTURED_OUTPUT: str = os.getenv('OCR_STRUCTURED_OUTPUT', 'json_schema')  # json_schema | json_object | none
+    OCR_STREAMING: bool = os.getenv('OCR_STREAMING', 'True').lower() == 'true'
+    OCR_STREAM_EARLY_STOP: bool = os.getenv('OCR_STREAM_EARLY_STOP', 'False').lower() == 'true'  # cortar la transcripción al tener los campos
+    OCR_FIELDS_ONLY: bool = os.getenv('OCR_FIELDS_ONLY', 'False').lower() == 'true'  # sin texto_legible por defecto
+    OCR_SIDE_TOKEN_HEADROOM: float = float(os.getenv('OCR_SIDE_TOKEN_HEADROOM', '2.0'))  # margen sobre la salida esperada por cara
+    # Cascada: primer intento barato (detail low, imagen reducida) y escalado solo si faltan campos
+    OCR_CASCADE_ENABLED: bool = os.getenv('OCR_CASCADE_ENABLED', 'False').lower() == 'true'
+    OCR_CASCADE_FAST_MODEL: str = os.getenv('OCR_CASCADE_FAST_MODEL', 'gpt-4o-mini')
+    OCR_CASCADE_FAST_LONG_EDGE: int = int(os.getenv('OCR_CASCADE_FAST_LONG_EDGE', '768'))
+    OCR_CASCADE_STRONG_MODEL: str = os.getenv('OCR_CASCADE_STRONG_MODEL', '')  # vacío = sin nivel extra
+    OCR_CASCADE_REQUIRED_FIELDS: str = os.getenv('OCR_CASCADE_REQUIRED_FIELDS', 'numero_documento,nombres,apellidos,fecha_nacimiento')
+    # Re-consulta de campos faltantes con un recorte ampliado de su región
+    OCR_REQUERY_ENABLED: bool = os.getenv('OCR_REQUERY_ENABLED', 'False').lower() == 'true'
+    OCR_REQUERY_MAX_FIELDS: int = int(os.getenv('OCR_REQUERY_MAX_FIELDS', '3'))  # más faltantes = mejor repetir el documento
+    OCR_REQUERY_LONG_EDGE: int = int(os.getenv('OCR_REQUERY_LONG_EDGE', '1024'))
+    # field_groups: lado largo máximo del recorte de la región de cada grupo
+    OCR_FIELD_GROUP_LONG_EDGE: int = int(os.getenv('OCR_FIELD_GROUP_LONG_EDGE', '768'))
+    # Micro-lotes: llamadas concurrentes compatibles se agrupan en una sola llamada multimodal
+    OCR_BATCH_ENABLED: bool = os.getenv('OCR_BATCH_ENABLED', 'False').lower() == 'true'
+    OCR_BATCH_SIZE: int = int(os.getenv('OCR_BATCH_SIZE', '4'))
+    OCR_BATCH_MAX_WAIT_MS: int = int(os.getenv('OCR_BATCH_MAX_WAIT_MS', '10'))
+    OCR_BATCH_MAX_ITEM_IMAGES: int = int(os.getenv('OCR_BATCH_MAX_ITEM_IMAGES', '2'))  # solo documentos pequeños
+    OCR_TOKEN_BUDGET: int = int(os.getenv('OCR_TOKEN_BUDGET', '0'))  # tokens estimados por documento; 0 = sin límite
+    
+    # Image preprocessing settings (perfil por defecto; ver src/utils/preprocessing.py)
+    IMAGE_MAX_LONG_EDGE: int = int(os.getenv('IMAGE_MAX_LONG_EDGE', '1536'))  # 0 = sin límite
+    IMAGE_GRAYSCALE: bool = os.getenv('IMAGE_GRAYSCALE', 'False').lower() == 'true'
+    IMAGE_DETAIL: str = os.getenv('IMAGE_DETAIL', 'high')  # low | high | auto
+    IMAGE_JPEG_QUALITY: int = int(os.getenv('IMAGE_JPEG_QUALITY', '85'))
+    IMAGE_AUTO_CROP: bool = os.getenv('IMAGE_AUTO_CROP', 'True').lower() == 'true'
     
     # Security settings
     MAX_FILE_SIZE: int = int(os.getenv('MAX_FILE_SIZE', '10485760'))  # 10MB
@@ -28,6 +59,53 @@ class Settings(BaseSettings):
     LOG_LEVEL: str = os.getenv('LOG_LEVEL', 'INFO')
     ENABLE_CACHE: bool = os.getenv('ENABLE_CACHE', 'True').lower() == 'true'
     CACHE_TTL: int = int(os.getenv('CACHE_TTL', '300'))  # 5 minutes
+    CACHE_MAX_BYTES: int = int(os.getenv('CACHE_MAX_BYTES', '67108864'))  # 64MB
+    DISK_CACHE_ENABLED: bool = os.getenv('DISK_CACHE_ENABLED', 'True').lower() == 'true'
+    DISK_CACHE_PATH: str = os.getenv('DISK_CACHE_PATH', 'ocr_cache.db')
+    DISK_CACHE_MAX_BYTES: int = int(os.getenv('DISK_CACHE_MAX_BYTES', '536870912'))  # 512MB
+    DISK_CACHE_TTL: int = int(os.getenv('DISK_CACHE_TTL', '604800'))  # 7 days
+    # Reutilizar el resultado de una foto casi idéntica: desactivado por defecto, un falso
+    # positivo devolvería los datos de otra persona con la misma plantilla de documento
+    PHASH_CACHE_ENABLED: bool = os.getenv('PHASH_CACHE_ENABLED', 'False').lower() == 'true'
+    PHASH_MAX_DISTANCE: int = int(os.getenv('PHASH_MAX_DISTANCE', '6'))  # bits de 256
+    # Comprobación de contenido: dHash de 64x64 (4096 bits), donde ya cuenta el texto
+    PHASH_VERIFY_MAX_DISTANCE: int = int(os.getenv('PHASH_VERIFY_MAX_DISTANCE', '40'))  # bits de 4096
+    PHASH_INDEX_SIZE: int = int(os.getenv('PHASH_INDEX_SIZE', '10000'))
+    
+    # Performance settings
+    IMAGE_POOL_WORKERS: int = int(os.getenv('IMAGE_POOL_WORKERS', '0'))  # 0 = os.cpu_count()
+    BATCH_CONCURRENCY: int = int(os.getenv('BATCH_CONCURRENCY', '8'))
+    BATCH_MAX_DOCUMENTS: int = int(os.getenv('BATCH_MAX_DOCUMENTS', '500'))
+    
+    # OpenAI scheduler settings (presupuestos del proveedor y concurrencia adaptativa)
+    # 0 = sin límite; configurar con los límites reales de la cuenta
+    OPENAI_RPM_LIMIT: int = int(os.getenv('OPENAI_RPM_LIMIT', '0'))
+    OPENAI_TPM_LIMIT: int = int(os.getenv('OPENAI_TPM_LIMIT', '0'))
+    OPENAI_INITIAL_CONCURRENCY: int = int(os.getenv('OPENAI_INITIAL_CONCURRENCY', '8'))
+    OPENAI_MIN_CONCURRENCY: int = int(os.getenv('OPENAI_MIN_CONCURRENCY', '1'))
+    OPENAI_MAX_CONCURRENCY: int = int(os.getenv('OPENAI_MAX_CONCURRENCY', '64'))
+    OPENAI_LATENCY_TARGET: float = float(os.getenv('OPENAI_LATENCY_TARGET', '10.0'))  # seconds
+    SCHEDULER_MAX_QUEUE_WAIT: float = float(os.getenv('SCHEDULER_MAX_QUEUE_WAIT', '60.0'))  # seconds, al menos una ventana de RPM/TPM
+    
+    # Resilience settings (reintentos y hedging de llamadas OCR)
+    OCR_MAX_RETRIES: int = int(os.getenv('OCR_MAX_RETRIES', '3'))
+    OCR_RETRY_BASE_DELAY: float = float(os.getenv('OCR_RETRY_BASE_DELAY', '0.5'))  # seconds
+    OCR_RETRY_MAX_DELAY: float = float(os.getenv('OCR_RETRY_MAX_DELAY', '8.0'))  # seconds
+    OCR_HEDGING_ENABLED: bool = os.getenv('OCR_HEDGING_ENABLED', 'False').lower() == 'true'
+    OCR_HEDGE_PERCENTILE: float = float(os.getenv('OCR_HEDGE_PERCENTILE', '0.95'))
+    OCR_HEDGE_MIN_DELAY: float = float(os.getenv('OCR_HEDGE_MIN_DELAY', '1.0'))  # seconds
+    OCR_HEDGE_MAX_FRACTION: float = float(os.getenv('OCR_HEDGE_MAX_FRACTION', '0.05'))  # 5% del tráfico
+    CIRCUIT_FAILURE_THRESHOLD: int = int(os.getenv('CIRCUIT_FAILURE_THRESHOLD', '5'))
+    CIRCUIT_RECOVERY_TIMEOUT: float = float(os.getenv('CIRCUIT_RECOVERY_TIMEOUT', '30.0'))  # seconds
+    CIRCUIT_HALF_OPEN_MAX_CALLS: int = int(os.getenv('CIRCUIT_HALF_OPEN_MAX_CALLS', '1'))
+    
+    # Job queue settings (cola local durable en SQLite)
+    JOBS_DB_PATH: str = os.getenv('JOBS_DB_PATH', 'jobs.db')
+    JOB_WORKERS: int = int(os.getenv('JOB_WORKERS', '4'))
+    JOB_POLL_INTERVAL: float = float(os.getenv('JOB_POLL_INTERVAL', '1.0'))  # seconds
+    JOB_LEASE_SECONDS: int = int(os.getenv('JOB_LEASE_SECONDS', '300'))
+    JOB_MAX_ATTEMPTS: int = int(os.getenv('JOB_MAX_ATTEMPTS', '3'))
+    JOB_RETRY_DELAY: float = float(os.getenv('JOB_RETRY_DELAY', '5.0'))  # seconds, se duplica en cada intento
     
     @validator('OPENAI_API_KEY')
     def validate_openai_key(cls, v):
@@ -35,6 +113,24 @@ class Settings(BaseSettings):
             raise ValueError('OPENAI_API_KEY is required')
         return v
     
+    @validator('OCR_MODE')
+    def validate_ocr_mode(cls, v):
+        if v not in ('per_side', 'combined', 'composite', 'field_groups'):
+            raise ValueError('OCR_MODE must be per_side, combined, composite or field_groups')
+        return v
+    
+    @validator('OCR_STRUCTURED_OUTPUT')
+    def validate_structured_output(cls, v):
+        if v not in ('json_schema', 'json_object', 'none'):
+            raise ValueError('OCR_STRUCTURED_OUTPUT must be json_schema, json_object or none')
+        return v
+    
+    @validator('IMAGE_DETAIL')
+    def validate_image_detail(cls, v):
+        if v not in ('low', 'high', 'auto'):
+            raise ValueError('IMAGE_DETAIL must be low, high or auto')
+        return v
+    
     @validator('DB_PASSWORD')
     def validate_db_password(cls, v):
         if not v:
@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.exc import SQLAlchemyError
 from src.config import settings
@@ -15,6 +15,22 @@ engine = create_engine(
 )
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Engine SQLite local para la cola de trabajos asíncronos (sobrevive reinicios
+# y se comparte entre los workers de uvicorn del mismo host)
+jobs_engine = create_engine(
+    f"sqlite:///{settings.JOBS_DB_PATH}",
+    connect_args={"check_same_thread": False, "timeout": 30},
+    echo=(settings.LOG_LEVEL == 'DEBUG')
+)
+JobsSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=jobs_engine)
+
+@event.listens_for(jobs_engine, "connect")
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.close()
+
 def get_db():
     db = SessionLocal()
     try:
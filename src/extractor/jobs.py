@@ -0,0 +1,264 @@
+import asyncio
+import base64
+import json
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+from sqlalchemy import Column, Float, Integer, String, Text, or_, update
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.exc import SQLAlchemyError
+from src.config import settings
+from src.extractor.database import JobsSessionLocal, jobs_engine
+from src.extractor.schema import ExtractionOptions
+from src.utils.logger import logger, db_logger
+
+JobsBase = declarative_base()
+
+STATUS_QUEUED = "queued"
+STATUS_RUNNING = "running"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+
+
+class Job(JobsBase):
+    __tablename__ = "jobs"
+    id = Column(String(36), primary_key=True)
+    status = Column(String(10), index=True, nullable=False, default=STATUS_QUEUED)
+    filename = Column(String(255), nullable=False)
+    payload = Column(Text)  # JSON con los archivos en base64; se borra al terminar
+    options = Column(Text)  # JSON con las ExtractionOptions de la solicitud
+    result = Column(Text)
+    error = Column(Text)
+    attempts = Column(Integer, nullable=False, default=0)
+    # Un job "running" con lease vencido vuelve a estar disponible; en uno "queued"
+    # que se reintenta, es el momento a partir del cual se puede reclamar
+    lease_until = Column(Float)
+    created_at = Column(Float, index=True, nullable=False)
+    updated_at = Column(Float, nullable=False)
+
+
+def init_jobs_db():
+    JobsBase.metadata.create_all(bind=jobs_engine)
+
+
+def enqueue_job(filename: str, files: List[bytes], options: Optional[Dict[str, Any]] = None) -> str:
+    now = time.time()
+    job = Job(
+        id=str(uuid.uuid4()),
+        status=STATUS_QUEUED,
+        filename=filename,
+        payload=json.dumps([base64.b64encode(data).decode() for data in files]),
+        options=json.dumps(options or {}),
+        attempts=0,
+        created_at=now,
+        updated_at=now
+    )
+    db = JobsSessionLocal()
+    try:
+        db.add(job)
+        db.commit()
+        return job.id
+    except SQLAlchemyError as e:
+        db.rollback()
+        db_logger.error("Error enqueuing job", error=e)
+        raise
+    finally:
+        db.close()
+
+
+def get_job(job_id: str) -> Optional[Dict[str, Any]]:
+    db = JobsSessionLocal()
+    try:
+        job = db.get(Job, job_id)
+        if job is None:
+            return None
+        return {
+            "job_id": job.id,
+            "status": job.status,
+            "filename": job.filename,
+            "attempts": job.attempts,
+            "result": json.loads(job.result) if job.result else None,
+            "error": job.error,
+            "created_at": job.created_at,
+            "updated_at": job.updated_at
+        }
+    finally:
+        db.close()
+
+
+def claim_next_job() -> Optional[Dict[str, Any]]:
+    """
+    Reclama el job más antiguo disponible (en cola, o en ejecución con el lease
+    vencido porque su worker murió). La actualización condicional garantiza que
+    solo un worker, de este u otro proceso, lo obtenga.
+    """
+    db = JobsSessionLocal()
+    try:
+        now = time.time()
+        available = or_(
+            (Job.status == STATUS_QUEUED) & (or_(Job.lease_until.is_(None), Job.lease_until < now)),
+            (Job.status == STATUS_RUNNING) & (Job.lease_until < now)
+        )
+        candidates = (
+            db.query(Job.id)
+            .filter(available, Job.attempts < settings.JOB_MAX_ATTEMPTS)
+            .order_by(Job.created_at)
+            .limit(5)
+            .all()
+        )
+        for (job_id,) in candidates:
+            claimed = db.execute(
+                update(Job)
+                .where(Job.id == job_id, available)
+                .values(
+                    status=STATUS_RUNNING,
+                    attempts=Job.attempts + 1,
+                    lease_until=now + settings.JOB_LEASE_SECONDS,
+                    updated_at=now
+                )
+            )
+            db.commit()
+            if claimed.rowcount == 1:
+                job = db.get(Job, job_id)
+                return {
+                    "job_id": job.id,
+                    "filename": job.filename,
+                    "attempts": job.attempts,
+                    "files": json.loads(job.payload or "[]"),
+                    "options": json.loads(job.options or "{}")
+                }
+        return None
+    except SQLAlchemyError as e:
+        db.rollback()
+        db_logger.error("Error claiming job", error=e)
+        return None
+    finally:
+        db.close()
+
+
+def finish_job(job_id: str, result: Optional[Dict[str, Any]] = None, error: Optional[str] = None):
+    db = JobsSessionLocal()
+    try:
+        db.execute(
+            update(Job)
+            .where(Job.id == job_id)
+            .values(
+                status=STATUS_FAILED if error else STATUS_DONE,
+                result=json.dumps(result, ensure_ascii=False, default=str) if result is not None else None,
+                error=error,
+                payload=None,
+                lease_until=None,
+                updated_at=time.time()
+            )
+        )
+        db.commit()
+    except SQLAlchemyError as e:
+        db.rollback()
+        db_logger.error("Error finishing job", error=e, job_id=job_id)
+        raise
+    finally:
+        db.close()
+
+
+def retry_job(job_id: str, error: str, delay: float):
+    """Devuelve el job a la cola, reclamable a partir de `delay` segundos; conserva los archivos"""
+    db = JobsSessionLocal()
+    try:
+        now = time.time()
+        db.execute(
+            update(Job)
+            .where(Job.id == job_id)
+            .values(status=STATUS_QUEUED, error=error, lease_until=now + delay, updated_at=now)
+        )
+        db.commit()
+    except SQLAlchemyError as e:
+        db.rollback()
+        db_logger.error("Error requeuing job", error=e, job_id=job_id)
+        raise
+    finally:
+        db.close()
+
+
+def fail_exhausted_jobs():
+    """Marca como fallidos los jobs que agotaron sus intentos (p. ej. tras varias caídas)"""
+    db = JobsSessionLocal()
+    try:
+        db.execute(
+            update(Job)
+            .where(
+                Job.status == STATUS_RUNNING,
+                Job.lease_until < time.time(),
+                Job.attempts >= settings.JOB_MAX_ATTEMPTS
+            )
+            .values(status=STATUS_FAILED, error="Se agotaron los intentos de procesamiento.", payload=None, updated_at=time.time())
+        )
+        db.commit()
+    except SQLAlchemyError as e:
+        db.rollback()
+        db_logger.error("Error expiring jobs", error=e)
+    finally:
+        db.close()
+
+
+class JobWorkerPool:
+    """Pool de workers asyncio que drena la cola durable de jobs"""
+
+    def __init__(self, handler, workers: Optional[int] = None):
+        # handler(filename, files, options) -> dict con el resultado o con "error" (fallo
+        # definitivo, p. ej. archivo no válido); si lanza una excepción el job se reintenta
+        self.handler = handler
+        self.workers = workers or settings.JOB_WORKERS
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup = asyncio.Event()
+
+    def start(self):
+        init_jobs_db()
+        self._tasks = [asyncio.create_task(self._run(i)) for i in range(self.workers)]
+        logger.info("Job workers started", workers=self.workers)
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        logger.info("Job workers stopped")
+
+    def notify(self):
+        """Despierta a los workers cuando se encola un job en este proceso"""
+        self._wakeup.set()
+
+    async def _run(self, worker_id: int):
+        while True:
+            job = await asyncio.to_thread(claim_next_job)
+            if job is None:
+                await asyncio.to_thread(fail_exhausted_jobs)
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=settings.JOB_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            start = time.time()
+            try:
+                files = [base64.b64decode(item) for item in job["files"]]
+                result = await self.handler(job["filename"], files, ExtractionOptions(**job["options"]))
+            except asyncio.CancelledError:
+                # El lease vencerá y otro worker retomará el job
+                raise
+            except Exception as e:
+                # Cola de OCR llena, circuito abierto o fallo del proveedor: se reintenta con backoff
+                await self._retry_or_fail(job, e)
+                continue
+            error = result.get("error") if isinstance(result, dict) else None
+            await asyncio.to_thread(finish_job, job["job_id"], result, error)
+            logger.document_processed(job["job_id"], time.time() - start, error is None, worker=worker_id)
+
+    async def _retry_or_fail(self, job: Dict[str, Any], e: Exception):
+        error = f"{type(e).__name__}: {e}"
+        if job["attempts"] < settings.JOB_MAX_ATTEMPTS:
+            delay = settings.JOB_RETRY_DELAY * 2 ** (job["attempts"] - 1)
+            logger.warning("Job failed, retrying", error=error, job_id=job["job_id"], attempts=job["attempts"], delay=delay)
+            await asyncio.to_thread(retry_job, job["job_id"], error, delay)
+        else:
+            logger.error("Job processing failed", error=e, job_id=job["job_id"], attempts=job["attempts"])
+            await asyncio.to_thread(finish_job, job["job_id"], None, error)
@@ -15,7 +15,7 @@ class Documento(Base):
     apellidos = Column(String(100))
     texto_legible = Column(Text)
 
-def save_to_database(entities, full_text):
+def save_to_database(entities, full_text=None):
     db = SessionLocal()
     try:
         doc = Documento(
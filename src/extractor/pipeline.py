@@ -0,0 +1,324 @@
+import asyncio
+import base64
+import hashlib
+import os
+import uuid
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+from src.config import settings
+from src.extractor.model import save_to_database
+from src.extractor.schema import ExtractionOptions
+from src.utils.circuit_breaker import CircuitOpenError
+from src.utils.field_regions import regions_for_fields
+from src.utils.image_processing import crop_field_region, extract_pdf_text, normalize_image, normalize_pdf, run_in_cpu_pool
+from src.utils.logger import logger
+from src.utils.ocr_openai import OCRExtractionError, OutputSpec, estimate_document_tokens, extract_document_sides, merge_side_results, output_spec, requery_fields
+from src.utils.preprocessing import BUDGET_FALLBACK_OVERRIDES, get_profile, scaled_size
+from src.utils.parser import CAMPOS_REQUERIDOS, detectar_tipo_documento, extract_entities
+from src.utils.singleflight import SingleFlight
+from src.utils.validators import DocumentValidator, ValidationError
+
+IMAGE_EXTENSIONS = ['.png', '.jpg', '.jpeg']
+
+# Reintentos concurrentes del mismo documento comparten una única extracción
+document_flight = SingleFlight("documents")
+
+
+class NormalizedDocument(NamedTuple):
+    pages: List[bytes]  # Una página JPEG por cara
+    phashes: List[int]  # Hash perceptual de cada cara
+    sizes: List[Tuple[int, int]]  # Tamaño de cada cara tras el preprocesamiento
+    detail: str  # Nivel de detalle de imagen para el modelo
+
+
+async def normalize_document(
+    filename: str,
+    files: List[bytes],
+    tipo_documento: Optional[str] = None,
+    profile_overrides: Optional[Dict[str, Any]] = None
+) -> NormalizedDocument:
+    """
+    Convierte el documento recibido (PDF o imágenes ya decodificadas) en una
+    lista de páginas JPEG, una por cara, preprocesadas con el perfil del tipo
+    de documento y con su hash perceptual. Lanza ValidationError si no es válido.
+    """
+    profile = get_profile(tipo_documento, profile_overrides)
+    ext = os.path.splitext(filename)[1].lower()
+    if not files:
+        raise ValidationError("Debes enviar al menos una imagen o un PDF.")
+    for data in files:
+        if len(data) > settings.MAX_FILE_SIZE:
+            raise ValidationError(f"El archivo supera el tamaño máximo ({settings.MAX_FILE_SIZE} bytes).")
+
+    if ext == '.pdf':
+        if len(files) != 1:
+            raise ValidationError("Envía un único PDF con frente y respaldo.")
+        try:
+            normalized = await run_in_cpu_pool(normalize_pdf, files[0], profile)
+        except ValueError as e:
+            raise ValidationError(str(e))
+    elif ext in IMAGE_EXTENSIONS:
+        normalized = await asyncio.gather(*(run_in_cpu_pool(normalize_image, data, profile) for data in files))
+    else:
+        raise ValidationError("Formato de archivo no soportado. Usa PDF, PNG o JPG.")
+    logger.info(
+        "Document preprocessed",
+        profile=tipo_documento or "default",
+        overrides=profile_overrides,
+        original_sizes=[page.original_size for page in normalized],
+        sizes=[page.size for page in normalized],
+        crop_pixel_reduction=[page.crop_reduction for page in normalized],
+        jpeg_bytes=[len(page.jpeg) for page in normalized],
+        detail=profile["detail"]
+    )
+    return NormalizedDocument(
+        pages=[page.jpeg for page in normalized],
+        phashes=[page.phash for page in normalized],
+        sizes=[page.size for page in normalized],
+        detail=profile["detail"]
+    )
+
+
+def spec_for_options(options: ExtractionOptions) -> OutputSpec:
+    """Campos y transcripción que se piden al modelo según las opciones de la solicitud"""
+    fields_only = settings.OCR_FIELDS_ONLY if options.fields_only is None else options.fields_only
+    return output_spec(
+        tuple(options.fields) if options.fields else None,
+        include_text=not (options.fields or fields_only)
+    )
+
+
+async def prepare_document(filename: str, files: List[bytes], options: ExtractionOptions) -> NormalizedDocument:
+    """
+    Normaliza el documento y, si la estimación de tokens supera OCR_TOKEN_BUDGET,
+    lo vuelve a procesar con el primer ajuste más barato que entra en el presupuesto
+    (o con el más barato de todos si ninguno entra).
+    """
+    document = await normalize_document(filename, files, options.tipo_documento)
+    budget = settings.OCR_TOKEN_BUDGET
+    if not budget:
+        return document
+    spec = spec_for_options(options)
+    estimate = estimate_document_tokens(
+        document.sizes, document.detail, options.ocr_mode, spec=spec, tipo_documento=options.tipo_documento
+    )
+    if estimate["total_tokens"] <= budget:
+        return document
+    for overrides in BUDGET_FALLBACK_OVERRIDES:
+        # Los tamaños tras el ajuste se predicen sin volver a procesar la imagen
+        sizes = [scaled_size(size, overrides["max_long_edge"]) for size in document.sizes]
+        cheaper = estimate_document_tokens(
+            sizes, overrides.get("detail", document.detail), options.ocr_mode, spec=spec, tipo_documento=options.tipo_documento
+        )
+        if cheaper["total_tokens"] <= budget or overrides is BUDGET_FALLBACK_OVERRIDES[-1]:
+            logger.info(
+                "Token budget exceeded, using cheaper preprocessing",
+                budget=budget,
+                estimated_tokens=estimate["total_tokens"],
+                new_estimated_tokens=cheaper["total_tokens"],
+                overrides=overrides
+            )
+            return await normalize_document(filename, files, options.tipo_documento, overrides)
+    return document
+
+
+async def estimate_document(
+    filename: str,
+    files: List[bytes],
+    options: Optional[ExtractionOptions] = None
+) -> Dict[str, Any]:
+    """Dry-run: preprocesa el documento y estima tokens, coste y latencia sin llamar al OCR ni guardar nada"""
+    options = options or ExtractionOptions()
+    document = await prepare_document(filename, files, options)
+    estimate = estimate_document_tokens(
+        document.sizes, document.detail, options.ocr_mode, spec=spec_for_options(options), tipo_documento=options.tipo_documento
+    )
+    return {
+        **estimate,
+        "sizes": document.sizes,
+        "token_budget": settings.OCR_TOKEN_BUDGET or None,
+        "within_budget": not settings.OCR_TOKEN_BUDGET or estimate["total_tokens"] <= settings.OCR_TOKEN_BUDGET
+    }
+
+
+def save_uploads(filename: str, files: List[bytes], pages: List[bytes]):
+    """Guarda los archivos originales (PDF) o las caras normalizadas (imágenes)"""
+    os.makedirs("uploads", exist_ok=True)
+    if os.path.splitext(filename)[1].lower() == '.pdf':
+        with open(f"uploads/{uuid.uuid4()}_{filename}", "wb") as f:
+            f.write(files[0])
+    else:
+        for idx, img_bytes in enumerate(pages):
+            with open(f"uploads/{uuid.uuid4()}_{idx}_{filename}", "wb") as f:
+                f.write(img_bytes)
+
+
+def document_hash(pages: List[bytes]) -> str:
+    """SHA-256 de las caras normalizadas, en orden"""
+    digest = hashlib.sha256()
+    for page in pages:
+        digest.update(hashlib.sha256(page).digest())
+    return digest.hexdigest()
+
+
+async def process_document(
+    filename: str,
+    files: List[bytes],
+    options: Optional[ExtractionOptions] = None
+) -> Dict[str, Any]:
+    """
+    Pipeline completo de un documento: normalización, OCR de todas las caras,
+    extracción de entidades y guardado en base de datos.
+    """
+    options = options or ExtractionOptions()
+    document = await prepare_document(filename, files, options)
+    return await document_flight.do(
+        f"{document_hash(document.pages)}:{options.model_dump_json()}",
+        lambda: _extract_and_save(filename, files, document, options)
+    )
+
+
+async def _extract_and_save(
+    filename: str,
+    files: List[bytes],
+    document: NormalizedDocument,
+    options: ExtractionOptions
+) -> Dict[str, Any]:
+    save_uploads(filename, files, document.pages)
+    pages_base64 = [base64.b64encode(page).decode() for page in document.pages]
+    spec = spec_for_options(options)
+
+    # OCR + Extraction para todas las caras (en paralelo)
+    try:
+        ocr_results = await extract_document_sides(
+            pages_base64,
+            document.phashes,
+            mode=options.ocr_mode,
+            detail=document.detail,
+            sizes=document.sizes,
+            spec=spec,
+            tipo_documento=options.tipo_documento
+        )
+    except CircuitOpenError:
+        return await _extract_degraded(filename, files)
+    full_text = None
+    if spec.include_text:
+        full_text = ""
+        for result in ocr_results:
+            full_text += (result.get("texto_legible") or "") + "\n"
+    # Une los campos de todas las caras para la extracción de entidades
+    # (sin transcripción el tipo se detecta solo con el tipo_documento del modelo)
+    raw_data = merge_side_results(ocr_results, spec, options.tipo_documento) if ocr_results else {}
+    if settings.OCR_REQUERY_ENABLED and raw_data:
+        raw_data = await _requery_missing_fields(filename, files, len(document.pages), raw_data, spec, options)
+    entities = extract_entities(full_text or "", raw_data=raw_data)
+    if options.fields:
+        entities = {
+            campo: valor for campo, valor in entities.items()
+            if campo in options.fields or campo in ("tipo_documento", "advertencia_tipo_documento")
+        }
+    return await _finish_document(entities, full_text)
+
+
+async def _requery_missing_fields(
+    filename: str,
+    files: List[bytes],
+    sides: int,
+    raw_data: Dict[str, Any],
+    spec: OutputSpec,
+    options: ExtractionOptions
+) -> Dict[str, Any]:
+    """
+    Re-consulta solo los campos nulos o rechazados por DocumentValidator, con
+    un recorte ampliado de su región en la cara original (una llamada por cara).
+    Solo se toman los valores re-consultados que el validador acepta.
+    Si faltan más de OCR_REQUERY_MAX_FIELDS no se intenta: el documento es ilegible.
+    """
+    tipo = options.tipo_documento
+    if tipo is None:
+        detectado, _ = detectar_tipo_documento("", raw_data.get("tipo_documento"))
+        tipo = None if detectado == "desconocido" else detectado
+    rejected = DocumentValidator.rejected_fields(raw_data)
+    missing = [
+        field for field in spec.fields
+        if field != "tipo_documento" and (not raw_data.get(field) or field in rejected)
+    ]
+    regions = regions_for_fields(tipo, missing, sides)
+    requested = [field for _, fields in regions.values() for field in fields]
+    if not requested or len(requested) > settings.OCR_REQUERY_MAX_FIELDS:
+        return raw_data
+
+    is_pdf = os.path.splitext(filename)[1].lower() == '.pdf'
+    profile = get_profile(options.tipo_documento)
+    crops = await asyncio.gather(*(
+        run_in_cpu_pool(
+            crop_field_region, files[0] if is_pdf else files[side], is_pdf, side, box, profile, settings.OCR_REQUERY_LONG_EDGE
+        )
+        for side, (box, _) in regions.items()
+    ))
+    results = await asyncio.gather(
+        *(
+            requery_fields(base64.b64encode(crop.jpeg).decode(), crop.size, fields, side)
+            for crop, (side, (_, fields)) in zip(crops, regions.items())
+        ),
+        return_exceptions=True
+    )
+    merged = dict(raw_data)
+    recovered = []
+    for result, (_, fields) in zip(results, regions.values()):
+        if isinstance(result, BaseException):
+            logger.warning("Field re-query failed", fields=fields, error=str(result))
+            continue
+        for field in fields:
+            if result.get(field):
+                merged[field] = result[field]
+                recovered.append(field)
+    logger.info("Missing fields re-queried", tipo=tipo, requested=requested, recovered=recovered)
+    return merged
+
+
+async def _extract_degraded(filename: str, files: List[bytes]) -> Dict[str, Any]:
+    """
+    Con el circuito de OCR abierto, usa la extracción local por regex si el
+    documento trae texto propio (PDF con capa de texto); si no, falla rápido.
+    """
+    local_text = ""
+    if os.path.splitext(filename)[1].lower() == '.pdf':
+        local_text = await run_in_cpu_pool(extract_pdf_text, files[0])
+    if len(local_text.strip()) < 10:
+        raise OCRExtractionError("El servicio de OCR no está disponible en este momento. Intenta de nuevo en unos minutos.")
+    logger.warning("OCR circuit open, using local text extraction", filename=filename, text_length=len(local_text))
+    entities = extract_entities(local_text, raw_data=None)
+    return await _finish_document(
+        entities,
+        local_text,
+        ["Advertencia: Extracción degradada (servicio de OCR no disponible); los datos se obtuvieron del texto del PDF."]
+    )
+
+
+async def _finish_document(
+    entities: Dict[str, Any],
+    full_text: Optional[str],
+    advertencias: Optional[List[str]] = None
+) -> Dict[str, Any]:
+    """Valida, guarda y arma la respuesta; full_text=None significa extracción sin transcripción"""
+    # Validación de legibilidad
+    advertencias = list(advertencias or [])
+    # Con corte temprano del streaming la transcripción puede ser corta aunque haya campos
+    campos_extraidos = any(entities.get(campo) for campo in CAMPOS_REQUERIDOS)
+    if (not full_text or len(full_text.strip()) < 10) and not campos_extraidos:
+        advertencias.append("Advertencia: El texto extraído es muy corto o ilegible. Verifique la calidad de la imagen.")
+    if "advertencia_tipo_documento" in entities:
+        advertencias.append(entities["advertencia_tipo_documento"])
+
+    # Save to DB (en un hilo para no bloquear el event loop)
+    await asyncio.to_thread(save_to_database, entities, full_text)
+
+    response = {
+        "tipo_documento": entities.get("tipo_documento", "Desconocido"),
+        "texto_legible": full_text,
+        "datos": entities,
+        "advertencias": advertencias if advertencias else None
+    }
+    if full_text is None:
+        del response["texto_legible"]
+    return response
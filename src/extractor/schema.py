@@ -1,5 +1,5 @@
-from pydantic import BaseModel
-from typing import Optional, Dict
+from pydantic import BaseModel, ConfigDict
+from typing import List, Literal, Optional, Dict
 
 
 # Esquema para la solicitud POST /extract
@@ -8,6 +8,24 @@ class DocumentRequest(BaseModel):
     file_base64: str
 
 
+# Campos que se pueden proyectar con `fields` (los de ExtractedData)
+CampoExtraido = Literal[
+    "tipo_documento", "numero_documento", "nombres", "apellidos", "fecha_nacimiento", "lugar_nacimiento",
+    "estatura", "grupo_sanguineo", "sexo", "fecha_expedicion", "lugar_expedicion"
+]
+
+
+# Opciones de extracción por solicitud (None = valor de configuración)
+class ExtractionOptions(BaseModel):
+    ocr_mode: Optional[Literal["per_side", "combined", "composite", "field_groups"]] = None
+    # Tipo esperado; selecciona el perfil de preprocesamiento de imagen
+    tipo_documento: Optional[Literal["cedula amarilla", "cedula digital", "cedula de extranjeria", "pasaporte"]] = None
+    # Proyección: solo estos campos (implica fields_only)
+    fields: Optional[List[CampoExtraido]] = None
+    # Sin transcripción: el modelo no genera texto_legible y no se devuelve ni se guarda
+    fields_only: Optional[bool] = None
+
+
 # Esquema para los datos extraídos
 class ExtractedData(BaseModel):
     tipo_documento: Optional[str]
@@ -23,8 +41,16 @@ class ExtractedData(BaseModel):
     lugar_expedicion: Optional[str]
 
 
+# Salida de cada llamada al modelo de OCR: los campos de ExtractedData y la
+# transcripción al final. Su JSON schema restringe la respuesta del modelo.
+class OCRFields(ExtractedData):
+    model_config = ConfigDict(extra="ignore")
+
+    texto_legible: Optional[str]
+
+
 # Esquema para la respuesta del API
 class DocumentResponse(BaseModel):
     tipo_documento: str
-    texto_legible: str
+    texto_legible: Optional[str] = None
     datos: Dict[str, Optional[str]]
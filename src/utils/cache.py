@@ -0,0 +1,195 @@
+import asyncio
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+from src.config import settings
+from src.utils.disk_cache import DiskCache
+from src.utils.logger import logger
+from src.utils.phash import PerceptualIndex
+
+
+def make_cache_key(image_base64: str, model: str, prompt_version: str) -> str:
+    """Clave del resultado OCR: hash de la imagen + modelo + versión del prompt"""
+    image_hash = hashlib.sha256(image_base64.encode()).hexdigest()
+    return f"{image_hash}:{model}:{prompt_version}"
+
+
+class CountMinSketch:
+    """Estimador aproximado de frecuencia de acceso (TinyLFU) con envejecimiento"""
+
+    def __init__(self, width: int = 4096, depth: int = 4):
+        self.width = width
+        self.depth = depth
+        self.rows = [[0] * width for _ in range(depth)]
+        self.additions = 0
+        # Tras `reset_after` incrementos se dividen los contadores a la mitad
+        self.reset_after = width * 10
+
+    def _indexes(self, key: str):
+        digest = hashlib.blake2b(key.encode(), digest_size=8 * self.depth).digest()
+        for i in range(self.depth):
+            yield i, int.from_bytes(digest[i * 8:(i + 1) * 8], "little") % self.width
+
+    def add(self, key: str):
+        for row, idx in self._indexes(key):
+            if self.rows[row][idx] < 255:
+                self.rows[row][idx] += 1
+        self.additions += 1
+        if self.additions >= self.reset_after:
+            self.rows = [[count >> 1 for count in row] for row in self.rows]
+            self.additions //= 2
+
+    def estimate(self, key: str) -> int:
+        return min(self.rows[row][idx] for row, idx in self._indexes(key))
+
+
+class OCRCache:
+    """
+    Caché en memoria de resultados OCR con expiración por TTL, límite en bytes y
+    admisión TinyLFU: un elemento nuevo solo desplaza a la víctima LRU si se ha
+    pedido con más frecuencia que ella.
+    """
+
+    def __init__(self, max_bytes: int, ttl: int):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (value, size, expires_at)
+        self._sketch = CountMinSketch()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.rejections = 0
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        self._sketch.add(key)
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        value, size, expires_at = entry
+        if expires_at <= time.monotonic():
+            self._remove(key)
+            self.expirations += 1
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return dict(value)
+
+    def set(self, key: str, value: Dict[str, Any]):
+        size = len(json.dumps(value, ensure_ascii=False, default=str).encode()) + len(key)
+        if size > self.max_bytes:
+            self.rejections += 1
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._purge_expired()
+        candidate_freq = self._sketch.estimate(key)
+        while self.current_bytes + size > self.max_bytes:
+            victim = next(iter(self._entries))
+            if self._sketch.estimate(victim) > candidate_freq:
+                self.rejections += 1
+                return
+            self._remove(victim)
+            self.evictions += 1
+        self._entries[key] = (dict(value), size, time.monotonic() + self.ttl)
+        self.current_bytes += size
+
+    def _remove(self, key: str):
+        _, size, _ = self._entries.pop(key)
+        self.current_bytes -= size
+
+    def _purge_expired(self):
+        now = time.monotonic()
+        expired = [key for key, (_, _, expires_at) in self._entries.items() if expires_at <= now]
+        for key in expired:
+            self._remove(key)
+            self.expirations += 1
+
+    def clear(self):
+        self._entries.clear()
+        self.current_bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": settings.ENABLE_CACHE,
+            "entries": len(self._entries),
+            "bytes": self.current_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "rejections": self.rejections
+        }
+
+
+# Global cache instances: memoria (nivel 1) y disco compartido por los workers (nivel 2)
+ocr_cache = OCRCache(max_bytes=settings.CACHE_MAX_BYTES, ttl=settings.CACHE_TTL)
+disk_cache = DiskCache(
+    path=settings.DISK_CACHE_PATH,
+    max_bytes=settings.DISK_CACHE_MAX_BYTES,
+    ttl=settings.DISK_CACHE_TTL
+) if settings.ENABLE_CACHE and settings.DISK_CACHE_ENABLED else None
+# Índice de hashes perceptuales recientes -> clave de caché (retomas del mismo documento)
+phash_index = PerceptualIndex(max_entries=settings.PHASH_INDEX_SIZE)
+logger.debug("OCR cache configured", enabled=settings.ENABLE_CACHE, max_bytes=settings.CACHE_MAX_BYTES, ttl=settings.CACHE_TTL, disk=disk_cache is not None)
+
+
+async def get_cached_result(key: str) -> Optional[Dict[str, Any]]:
+    """Busca en memoria y luego en disco; un acierto en disco se promueve a memoria"""
+    value = ocr_cache.get(key)
+    if value is None and disk_cache is not None:
+        value = await asyncio.to_thread(disk_cache.get, key)
+        if value is not None:
+            ocr_cache.set(key, value)
+    return value
+
+
+async def store_result(key: str, value: Dict[str, Any]):
+    ocr_cache.set(key, value)
+    if disk_cache is not None:
+        await asyncio.to_thread(disk_cache.set, key, value)
+
+
+async def get_similar_result(phash: int, content: int, key_suffix: str) -> Optional[Dict[str, Any]]:
+    """
+    Busca un resultado cacheado de una imagen casi idéntica (distancia de Hamming
+    <= PHASH_MAX_DISTANCE) generado con el mismo modelo y versión de prompt. El
+    candidato solo se reutiliza si su content_hash también coincide
+    (<= PHASH_VERIFY_MAX_DISTANCE): el hash de 16x16 no distingue a dos personas
+    con la misma plantilla.
+    """
+    if not settings.PHASH_CACHE_ENABLED:
+        return None
+    match = phash_index.find(phash, settings.PHASH_MAX_DISTANCE)
+    if match is None or not match[0].endswith(key_suffix):
+        return None
+    if not phash_index.content_matches(match[0], content, settings.PHASH_VERIFY_MAX_DISTANCE):
+        phash_index.rejected += 1
+        logger.debug("Perceptual match rejected by content check", key=match[0][:12], distance=match[1])
+        return None
+    value = await get_cached_result(match[0])
+    if value is not None:
+        phash_index.near_hits += 1
+        logger.debug("Perceptual cache hit", key=match[0][:12], distance=match[1])
+    return value
+
+
+def remember_phash(phash: int, content: int, key: str):
+    if settings.PHASH_CACHE_ENABLED:
+        phash_index.add(phash, key, content)
+
+
+def cache_stats() -> Dict[str, Any]:
+    return {
+        "memory": ocr_cache.stats(),
+        "disk": disk_cache.stats() if disk_cache is not None else None,
+        "perceptual": phash_index.stats() if settings.PHASH_CACHE_ENABLED else None
+    }
@@ -0,0 +1,99 @@
+import time
+from typing import Any, Awaitable, Callable, Dict, Tuple, Type
+from src.utils.logger import ocr_logger
+
+STATE_CLOSED = "closed"
+STATE_OPEN = "open"
+STATE_HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """El backend está marcado como caído; la llamada se rechaza sin esperar"""
+    pass
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker para el backend de OCR:
+    - closed: las llamadas pasan; tras `failure_threshold` fallos seguidos se abre.
+    - open: se rechaza todo con CircuitOpenError durante `recovery_timeout` segundos.
+    - half_open: se permiten `half_open_max_calls` llamadas de prueba; si una
+      funciona se cierra, si falla se vuelve a abrir.
+    Solo cuentan como fallo los errores de `failure_exceptions` (caídas del
+    proveedor), no, por ejemplo, una respuesta con JSON inválido.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int,
+        recovery_timeout: float,
+        half_open_max_calls: int,
+        failure_exceptions: Tuple[Type[BaseException], ...]
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self.failure_exceptions = failure_exceptions
+        self.state = STATE_CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.trial_calls = 0
+        self.rejected = 0
+        self.times_opened = 0
+
+    def _before_call(self):
+        if self.state == STATE_OPEN:
+            if time.monotonic() - self.opened_at < self.recovery_timeout:
+                self.rejected += 1
+                raise CircuitOpenError(f"Circuito '{self.name}' abierto: backend no disponible.")
+            self.state = STATE_HALF_OPEN
+            self.trial_calls = 0
+            ocr_logger.info("Circuit half-open", circuit=self.name)
+        if self.state == STATE_HALF_OPEN:
+            if self.trial_calls >= self.half_open_max_calls:
+                self.rejected += 1
+                raise CircuitOpenError(f"Circuito '{self.name}' en prueba: backend no disponible.")
+            self.trial_calls += 1
+
+    def _on_success(self):
+        if self.state != STATE_CLOSED:
+            ocr_logger.info("Circuit closed", circuit=self.name)
+        self.state = STATE_CLOSED
+        self.consecutive_failures = 0
+
+    def _on_failure(self):
+        self.consecutive_failures += 1
+        if self.state == STATE_HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            self.state = STATE_OPEN
+            self.opened_at = time.monotonic()
+            self.times_opened += 1
+            ocr_logger.warning("Circuit opened", circuit=self.name, consecutive_failures=self.consecutive_failures)
+
+    async def call(self, func: Callable[[], Awaitable[Any]]) -> Any:
+        self._before_call()
+        try:
+            result = await func()
+        except self.failure_exceptions:
+            self._on_failure()
+            raise
+        except BaseException:
+            # Error ajeno a la disponibilidad del backend: libera la llamada de prueba
+            if self.state == STATE_HALF_OPEN:
+                self.trial_calls -= 1
+            raise
+        self._on_success()
+        return result
+
+    @property
+    def is_open(self) -> bool:
+        return self.state == STATE_OPEN and time.monotonic() - self.opened_at < self.recovery_timeout
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "times_opened": self.times_opened,
+            "rejected": self.rejected
+        }
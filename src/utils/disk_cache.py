@@ -0,0 +1,176 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+from src.utils.logger import logger
+
+
+class DiskCache:
+    """
+    Segundo nivel de caché para respuestas OCR, persistido en SQLite.
+    Sobrevive a los despliegues y lo comparten todos los workers del host.
+
+    - Escrituras atómicas (transacción + WAL) y checksum por entrada: una
+      entrada corrupta se descarta en lectura en lugar de devolverse.
+    - Tamaño acotado: al superar `max_bytes` se compacta eliminando las
+      entradas con acceso más antiguo (LRU) hasta el 90% del límite.
+    - Si el archivo está dañado se aparta y se crea uno nuevo.
+    - El archivo se abre en el primer uso, no al importar el módulo.
+    """
+
+    COMPACT_EVERY = 50  # escrituras entre comprobaciones de tamaño
+
+    def __init__(self, path: str, max_bytes: int, ttl: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._local = threading.local()
+        self._lock = threading.RLock()
+        self._ready = False
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+        self.corrupted = 0
+        self.evictions = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _init_db(self):
+        if self._ready:
+            return
+        with self._lock:
+            if self._ready:
+                return
+            try:
+                self._create_schema()
+            except sqlite3.DatabaseError as e:
+                self._recover(e)
+            self._ready = True
+
+    def _create_schema(self):
+        conn = self._connect()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS ocr_cache ("
+            " key TEXT PRIMARY KEY,"
+            " value BLOB NOT NULL,"
+            " checksum TEXT NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " expires_at REAL NOT NULL,"
+            " last_access REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_ocr_cache_last_access ON ocr_cache (last_access)")
+
+    def _recover(self, error: Exception):
+        """Aparta el archivo dañado y empieza con una caché vacía"""
+        logger.error("Disk cache corrupted, recreating", error=error, path=self.path)
+        with self._lock:
+            conn = getattr(self._local, "conn", None)
+            if conn is not None:
+                conn.close()
+                self._local.conn = None
+            if os.path.exists(self.path):
+                os.replace(self.path, f"{self.path}.corrupt-{int(time.time())}")
+            for suffix in ("-wal", "-shm"):
+                if os.path.exists(self.path + suffix):
+                    os.remove(self.path + suffix)
+            self._create_schema()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        self._init_db()
+        try:
+            conn = self._connect()
+            row = conn.execute(
+                "SELECT value, checksum, expires_at FROM ocr_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            value, checksum, expires_at = row
+            now = time.time()
+            if expires_at <= now:
+                conn.execute("DELETE FROM ocr_cache WHERE key = ?", (key,))
+                self.misses += 1
+                return None
+            if hashlib.sha256(value).hexdigest() != checksum:
+                conn.execute("DELETE FROM ocr_cache WHERE key = ?", (key,))
+                self.corrupted += 1
+                self.misses += 1
+                return None
+            conn.execute("UPDATE ocr_cache SET last_access = ? WHERE key = ?", (now, key))
+            self.hits += 1
+            return json.loads(value)
+        except sqlite3.DatabaseError as e:
+            self._recover(e)
+            self.misses += 1
+            return None
+
+    def set(self, key: str, value: Dict[str, Any]):
+        data = json.dumps(value, ensure_ascii=False, default=str).encode()
+        now = time.time()
+        self._init_db()
+        try:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO ocr_cache (key, value, checksum, size, expires_at, last_access)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (key, data, hashlib.sha256(data).hexdigest(), len(data), now + self.ttl, now)
+            )
+            self._writes += 1
+            if self._writes % self.COMPACT_EVERY == 0:
+                self.compact()
+        except sqlite3.DatabaseError as e:
+            self._recover(e)
+
+    def compact(self):
+        """Elimina entradas expiradas y, si hace falta, las menos usadas recientemente"""
+        conn = self._connect()
+        conn.execute("DELETE FROM ocr_cache WHERE expires_at <= ?", (time.time(),))
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM ocr_cache").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        target = int(self.max_bytes * 0.9)
+        removed = 0
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for key, size in conn.execute("SELECT key, size FROM ocr_cache ORDER BY last_access").fetchall():
+                if total <= target:
+                    break
+                conn.execute("DELETE FROM ocr_cache WHERE key = ?", (key,))
+                total -= size
+                removed += 1
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        self.evictions += removed
+        logger.info("Disk cache compacted", removed=removed, bytes=total)
+
+    def stats(self) -> Dict[str, Any]:
+        entries, total = None, None
+        if self._ready:
+            try:
+                entries, total = self._connect().execute(
+                    "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM ocr_cache"
+                ).fetchone()
+            except sqlite3.DatabaseError:
+                pass
+        return {
+            "path": self.path,
+            "entries": entries,
+            "bytes": total,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "corrupted": self.corrupted
+        }
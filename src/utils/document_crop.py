@@ -0,0 +1,90 @@
+from typing import Optional, Tuple
+import numpy as np
+
+# Lado largo de la copia reducida sobre la que se detecta el documento
+DETECTION_LONG_EDGE = 400
+# Por debajo de esta fracción del área la detección no es fiable (o no hay documento)
+MIN_AREA_FRACTION = 0.15
+# Por encima de esta fracción recortar no compensa
+MAX_AREA_FRACTION = 0.92
+
+
+def _shoelace_area(quad: np.ndarray) -> float:
+    x, y = quad[:, 0], quad[:, 1]
+    return 0.5 * abs(np.dot(x, np.roll(y, 1)) - np.dot(y, np.roll(x, 1)))
+
+
+def detect_document_quad(rgb: np.ndarray) -> Optional[np.ndarray]:
+    """
+    Detecta las cuatro esquinas del documento (sup-izq, sup-der, inf-der, inf-izq)
+    en una imagen RGB reducida. El fondo se estima con la mediana de una franja
+    del borde; los perfiles de proyección de la máscara de primer plano acotan la
+    tarjeta y sus puntos extremos (x+y, x-y) dan las esquinas aunque esté rotada
+    o en perspectiva. Devuelve None si no hay un documento claro.
+    """
+    h, w, _ = rgb.shape
+    band = max(2, min(h, w) // 20)
+    border = np.concatenate([
+        rgb[:band].reshape(-1, 3), rgb[-band:].reshape(-1, 3),
+        rgb[:, :band].reshape(-1, 3), rgb[:, -band:].reshape(-1, 3)
+    ]).astype(np.float32)
+    background = np.median(border, axis=0)
+    border_spread = np.percentile(np.linalg.norm(border - background, axis=1), 90)
+    distance = np.linalg.norm(rgb.astype(np.float32) - background, axis=2)
+    mask = distance > max(border_spread * 1.5, 25.0)
+
+    # Perfiles de proyección: filas/columnas con suficiente primer plano
+    rows = np.flatnonzero(mask.mean(axis=1) > 0.2)
+    cols = np.flatnonzero(mask.mean(axis=0) > 0.2)
+    if rows.size < h * 0.2 or cols.size < w * 0.2:
+        return None
+    r0, r1, c0, c1 = rows[0], rows[-1], cols[0], cols[-1]
+    ys, xs = np.nonzero(mask[r0:r1 + 1, c0:c1 + 1])
+    if xs.size == 0:
+        return None
+    xs = xs + c0
+    ys = ys + r0
+    s, d = xs + ys, xs - ys
+    quad = np.array([
+        [xs[s.argmin()], ys[s.argmin()]],
+        [xs[d.argmax()], ys[d.argmax()]],
+        [xs[s.argmax()], ys[s.argmax()]],
+        [xs[d.argmin()], ys[d.argmin()]],
+    ], dtype=np.float32)
+
+    area_fraction = _shoelace_area(quad) / float(h * w)
+    if not MIN_AREA_FRACTION <= area_fraction <= MAX_AREA_FRACTION:
+        return None
+    return quad
+
+
+def crop_document(img) -> Tuple[object, float]:
+    """
+    Recorta la imagen PIL al documento y corrige la perspectiva.
+    Devuelve (imagen, fracción de píxeles eliminados); si no se detecta un
+    documento claro devuelve la imagen original y 0.0.
+    """
+    from PIL import Image
+    rgb_img = img.convert("RGB")
+    scale = DETECTION_LONG_EDGE / max(rgb_img.size) if max(rgb_img.size) > DETECTION_LONG_EDGE else 1.0
+    small = rgb_img.resize((max(1, round(rgb_img.width * scale)), max(1, round(rgb_img.height * scale))), Image.BILINEAR)
+    quad = detect_document_quad(np.asarray(small))
+    if quad is None:
+        return img, 0.0
+
+    tl, tr, br, bl = quad / scale
+    width = int(round(max(np.linalg.norm(tr - tl), np.linalg.norm(br - bl))))
+    height = int(round(max(np.linalg.norm(bl - tl), np.linalg.norm(br - tr))))
+    if width < 50 or height < 50:
+        return img, 0.0
+    # QUAD: esquinas de origen sup-izq, inf-izq, inf-der, sup-der -> rectángulo de salida
+    cropped = rgb_img.transform(
+        (width, height),
+        Image.QUAD,
+        data=(*tl, *bl, *br, *tr),
+        resample=Image.BICUBIC
+    )
+    reduction = 1.0 - (width * height) / float(rgb_img.width * rgb_img.height)
+    if reduction <= 0:
+        return img, 0.0
+    return cropped, reduction
@@ -0,0 +1,81 @@
+from typing import Dict, List, Optional, Tuple
+
+# Región aproximada de cada campo por tipo de documento, como fracción del
+# documento ya recortado: (cara, (x0, y0, x1, y1)); cara 0 = frente, 1 = respaldo.
+# Son cajas holgadas: sirven para re-consultar un campo con más resolución,
+# no para localizarlo con precisión.
+Region = Tuple[int, Tuple[float, float, float, float]]
+
+FIELD_REGIONS: Dict[str, Dict[str, Region]] = {
+    "cedula amarilla": {
+        "numero_documento": (0, (0.0, 0.10, 0.75, 0.45)),
+        "apellidos": (0, (0.0, 0.30, 0.75, 0.65)),
+        "nombres": (0, (0.0, 0.45, 0.75, 0.80)),
+        "fecha_nacimiento": (1, (0.0, 0.0, 0.70, 0.35)),
+        "lugar_nacimiento": (1, (0.0, 0.10, 0.70, 0.45)),
+        "estatura": (1, (0.0, 0.25, 0.70, 0.60)),
+        "grupo_sanguineo": (1, (0.0, 0.25, 0.70, 0.60)),
+        "sexo": (1, (0.0, 0.25, 0.70, 0.60)),
+        "fecha_expedicion": (1, (0.0, 0.40, 0.70, 0.80)),
+        "lugar_expedicion": (1, (0.0, 0.40, 0.70, 0.80)),
+    },
+    "cedula digital": {
+        "numero_documento": (0, (0.25, 0.0, 1.0, 0.30)),
+        "apellidos": (0, (0.25, 0.10, 1.0, 0.40)),
+        "nombres": (0, (0.25, 0.20, 1.0, 0.50)),
+        "fecha_nacimiento": (0, (0.25, 0.35, 1.0, 0.70)),
+        "lugar_nacimiento": (0, (0.25, 0.35, 1.0, 0.70)),
+        "estatura": (0, (0.25, 0.45, 1.0, 0.80)),
+        "grupo_sanguineo": (0, (0.25, 0.45, 1.0, 0.80)),
+        "sexo": (0, (0.25, 0.45, 1.0, 0.80)),
+        "fecha_expedicion": (0, (0.25, 0.60, 1.0, 1.0)),
+        "lugar_expedicion": (0, (0.25, 0.60, 1.0, 1.0)),
+    },
+    "cedula de extranjeria": {
+        "numero_documento": (0, (0.25, 0.0, 1.0, 0.30)),
+        "apellidos": (0, (0.25, 0.10, 1.0, 0.45)),
+        "nombres": (0, (0.25, 0.25, 1.0, 0.55)),
+        "fecha_nacimiento": (0, (0.25, 0.45, 1.0, 0.80)),
+        "sexo": (0, (0.25, 0.45, 1.0, 0.80)),
+        "lugar_nacimiento": (1, (0.0, 0.0, 1.0, 0.50)),
+        "fecha_expedicion": (1, (0.0, 0.0, 1.0, 0.50)),
+        "lugar_expedicion": (1, (0.0, 0.25, 1.0, 0.75)),
+    },
+    "pasaporte": {
+        "numero_documento": (0, (0.55, 0.0, 1.0, 0.25)),
+        "apellidos": (0, (0.28, 0.10, 1.0, 0.40)),
+        "nombres": (0, (0.28, 0.20, 1.0, 0.50)),
+        "fecha_nacimiento": (0, (0.28, 0.35, 1.0, 0.65)),
+        "sexo": (0, (0.28, 0.40, 1.0, 0.70)),
+        "lugar_nacimiento": (0, (0.28, 0.45, 1.0, 0.75)),
+        "fecha_expedicion": (0, (0.28, 0.55, 1.0, 0.85)),
+        "lugar_expedicion": (0, (0.28, 0.60, 1.0, 0.90)),
+    },
+}
+
+
+def regions_for_fields(
+    tipo_documento: Optional[str],
+    fields: List[str],
+    sides: int
+) -> Dict[int, Tuple[Tuple[float, float, float, float], List[str]]]:
+    """
+    Agrupa los campos por cara y devuelve, para cada cara disponible, la caja
+    que los contiene a todos. Se omiten los campos que el tipo no tiene o cuya
+    cara no se recibió. Sin tipo conocido se usa la distribución de la cédula amarilla.
+    """
+    layout = FIELD_REGIONS.get(tipo_documento or "", FIELD_REGIONS["cedula amarilla"])
+    grouped: Dict[int, Tuple[Tuple[float, float, float, float], List[str]]] = {}
+    for field in fields:
+        if field not in layout:
+            continue
+        side, box = layout[field]
+        if side >= sides:
+            continue
+        if side in grouped:
+            (x0, y0, x1, y1), side_fields = grouped[side]
+            box = (min(x0, box[0]), min(y0, box[1]), max(x1, box[2]), max(y1, box[3]))
+            grouped[side] = (box, side_fields + [field])
+        else:
+            grouped[side] = (box, [field])
+    return grouped
@@ -0,0 +1,72 @@
+import asyncio
+import os
+from typing import Optional
+import httpx
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Configuración del pool HTTP hacia el backend de OCR; DNI-DETECTION lee las
+# mismas variables en su propio DNI-DETECTION/utils/http_client.py.
+HTTP2_ENABLED = os.getenv('HTTP2_ENABLED', 'True').lower() == 'true'
+HTTP_MAX_CONNECTIONS = int(os.getenv('HTTP_MAX_CONNECTIONS', '100'))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv('HTTP_MAX_KEEPALIVE_CONNECTIONS', '20'))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv('HTTP_KEEPALIVE_EXPIRY', '120'))  # seconds
+HTTP_CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', '5'))
+HTTP_READ_TIMEOUT = float(os.getenv('HTTP_READ_TIMEOUT', '60'))
+HTTP_WRITE_TIMEOUT = float(os.getenv('HTTP_WRITE_TIMEOUT', '30'))
+HTTP_POOL_TIMEOUT = float(os.getenv('HTTP_POOL_TIMEOUT', '10'))
+HTTP_WARM_CONNECTIONS = int(os.getenv('HTTP_WARM_CONNECTIONS', '2'))
+
+_async_client: Optional[httpx.AsyncClient] = None
+
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY
+    )
+
+
+def _timeout() -> httpx.Timeout:
+    """Timeouts por fase: conexión, lectura, escritura y espera de conexión del pool"""
+    return httpx.Timeout(
+        connect=HTTP_CONNECT_TIMEOUT,
+        read=HTTP_READ_TIMEOUT,
+        write=HTTP_WRITE_TIMEOUT,
+        pool=HTTP_POOL_TIMEOUT
+    )
+
+
+def get_async_http_client() -> httpx.AsyncClient:
+    """Cliente HTTP/2 compartido (pool de conexiones keep-alive) para el servicio FastAPI"""
+    global _async_client
+    if _async_client is None or _async_client.is_closed:
+        _async_client = httpx.AsyncClient(http2=HTTP2_ENABLED, limits=_limits(), timeout=_timeout())
+    return _async_client
+
+
+async def warm_up_connections(openai_client, connections: int = HTTP_WARM_CONNECTIONS):
+    """
+    Abre y mantiene calientes conexiones TLS hacia el proveedor en el arranque,
+    para que el handshake no caiga en la primera solicitud de cada worker.
+    """
+    from src.utils.logger import logger
+    results = await asyncio.gather(
+        *(openai_client.models.list() for _ in range(max(1, connections))),
+        return_exceptions=True
+    )
+    failures = [result for result in results if isinstance(result, BaseException)]
+    if failures:
+        logger.warning("HTTP connection warm-up failed", failed=len(failures), error_type=type(failures[0]).__name__)
+    else:
+        logger.info("HTTP connections warmed", connections=len(results), http2=HTTP2_ENABLED)
+
+
+async def close_http_clients():
+    """Cierra el pool; get_async_http_client abre uno nuevo en el siguiente uso"""
+    global _async_client
+    if _async_client is not None:
+        await _async_client.aclose()
+        _async_client = None
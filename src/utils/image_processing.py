@@ -0,0 +1,164 @@
+import asyncio
+import io
+import os
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+from src.config import settings
+from src.utils.logger import logger
+from src.utils.document_crop import crop_document
+from src.utils.phash import dhash
+from src.utils.preprocessing import apply_profile
+
+# Pool de procesos para las etapas de CPU (rasterización de PDF, decodificación y
+# re-codificación JPEG). Se crea en el arranque de la aplicación y se reutiliza.
+_executor: Optional[ProcessPoolExecutor] = None
+
+
+def _init_worker():
+    """Importa PIL, NumPy y pdf2image una sola vez por proceso"""
+    import numpy  # noqa: F401
+    import PIL.Image  # noqa: F401
+    import pdf2image  # noqa: F401
+    PIL.Image.init()
+
+
+def _warmup(_: int = 0) -> int:
+    return os.getpid()
+
+
+class NormalizedPage(NamedTuple):
+    jpeg: bytes
+    phash: int
+    size: Tuple[int, int]  # Tamaño enviado al modelo
+    original_size: Tuple[int, int]
+    crop_reduction: float = 0.0  # Fracción de píxeles eliminados por el recorte
+
+
+def _encode_jpeg(img, quality: int = 75) -> bytes:
+    img_byte_arr = io.BytesIO()
+    if img.mode not in ('RGB', 'L'):
+        img = img.convert('RGB')
+    img.save(img_byte_arr, format='JPEG', quality=quality)
+    return img_byte_arr.getvalue()
+
+
+def _normalize_page(img, profile: Optional[Dict[str, Any]]) -> NormalizedPage:
+    original_size = img.size
+    img = img.convert('RGB')
+    crop_reduction = 0.0
+    if profile and profile.get("crop"):
+        img, crop_reduction = crop_document(img)
+    if profile:
+        img = apply_profile(img, profile)
+    quality = profile.get("jpeg_quality", 75) if profile else 75
+    return NormalizedPage(_encode_jpeg(img, quality), dhash(img), img.size, original_size, round(crop_reduction, 4))
+
+
+def normalize_pdf(pdf_bytes: bytes, profile: Optional[Dict[str, Any]] = None) -> List[NormalizedPage]:
+    """Rasteriza un PDF (máx. 2 páginas) y devuelve cada página preprocesada como JPEG con su hash perceptual"""
+    from pdf2image import convert_from_bytes
+    images = convert_from_bytes(pdf_bytes)
+    if len(images) > 2:
+        raise ValueError("El PDF debe tener máximo 2 páginas: frente y respaldo.")
+    return [_normalize_page(img, profile) for img in images]
+
+
+def normalize_image(image_bytes: bytes, profile: Optional[Dict[str, Any]] = None) -> NormalizedPage:
+    """Decodifica una imagen (PNG/JPG), aplica el perfil de preprocesamiento y la re-codifica a JPEG"""
+    from PIL import Image
+    img = Image.open(io.BytesIO(image_bytes))
+    return _normalize_page(img, profile)
+
+
+def downscale_page(page: bytes, max_long_edge: int, quality: int = 75) -> NormalizedPage:
+    """Reduce una cara ya normalizada (JPEG) al lado largo indicado"""
+    from PIL import Image
+    img = apply_profile(Image.open(io.BytesIO(page)).convert('RGB'), {"max_long_edge": max_long_edge})
+    return NormalizedPage(_encode_jpeg(img, quality), dhash(img), img.size, img.size)
+
+
+def crop_field_region(
+    data: bytes,
+    is_pdf: bool,
+    page_index: int,
+    box: Tuple[float, float, float, float],
+    profile: Optional[Dict[str, Any]] = None,
+    max_long_edge: int = 1024
+) -> NormalizedPage:
+    """
+    Recorta una región (fracciones del documento) de la cara original, sin la
+    reducción del perfil: el recorte conserva más resolución que la cara enviada
+    en la primera pasada. Aplica el mismo recorte al documento que _normalize_page.
+    """
+    if is_pdf:
+        from pdf2image import convert_from_bytes
+        img = convert_from_bytes(data, first_page=page_index + 1, last_page=page_index + 1)[0]
+    else:
+        from PIL import Image
+        img = Image.open(io.BytesIO(data))
+    img = img.convert('RGB')
+    if profile and profile.get("crop"):
+        img, _ = crop_document(img)
+    width, height = img.size
+    x0, y0, x1, y1 = box
+    region = img.crop((round(x0 * width), round(y0 * height), round(x1 * width), round(y1 * height)))
+    region = apply_profile(region, {"max_long_edge": max_long_edge, "grayscale": bool(profile and profile.get("grayscale"))})
+    quality = profile.get("jpeg_quality", 75) if profile else 75
+    return NormalizedPage(_encode_jpeg(region, quality), dhash(region), region.size, img.size)
+
+
+def compose_pages(pages: List[bytes]) -> NormalizedPage:
+    """Une las caras (JPEG) en una sola imagen vertical: frente arriba, respaldo abajo"""
+    from PIL import Image
+    images = [Image.open(io.BytesIO(page)).convert('RGB') for page in pages]
+    width = max(img.width for img in images)
+    canvas = Image.new('RGB', (width, sum(img.height for img in images)), 'white')
+    offset = 0
+    for img in images:
+        canvas.paste(img, ((width - img.width) // 2, offset))
+        offset += img.height
+    return NormalizedPage(_encode_jpeg(canvas, settings.IMAGE_JPEG_QUALITY), dhash(canvas), canvas.size, canvas.size)
+
+
+def extract_pdf_text(pdf_bytes: bytes) -> str:
+    """Texto embebido del PDF (pdftotext de poppler); vacío si es un escaneo sin capa de texto"""
+    try:
+        completed = subprocess.run(
+            ["pdftotext", "-layout", "-", "-"],
+            input=pdf_bytes,
+            capture_output=True,
+            timeout=30,
+            check=True
+        )
+    except (OSError, subprocess.SubprocessError):
+        return ""
+    return completed.stdout.decode("utf-8", errors="ignore")
+
+
+def start_cpu_pool(workers: Optional[int] = None) -> ProcessPoolExecutor:
+    """Crea el pool de procesos y lo precalienta (procesos levantados y PIL importado)"""
+    global _executor
+    if _executor is not None:
+        return _executor
+    workers = workers or settings.IMAGE_POOL_WORKERS or os.cpu_count() or 1
+    _executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker)
+    pids = set(_executor.map(_warmup, range(workers * 2)))
+    logger.info("CPU pool started", workers=workers, warm_processes=len(pids))
+    return _executor
+
+
+def shutdown_cpu_pool():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True, cancel_futures=True)
+        _executor = None
+        logger.info("CPU pool stopped")
+
+
+async def run_in_cpu_pool(func: Callable, *args, **kwargs):
+    """Ejecuta una función de CPU en el pool sin bloquear el event loop"""
+    executor = _executor or start_cpu_pool()
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, partial(func, *args, **kwargs))
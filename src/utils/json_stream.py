@@ -0,0 +1,119 @@
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+_WHITESPACE = " \t\r\n"
+
+
+class IncrementalJSONParser:
+    """
+    Parser incremental de un objeto JSON: recibe la respuesta del modelo por
+    trozos y devuelve cada campo de primer nivel en cuanto su valor se cierra.
+    Ignora el texto anterior a la primera llave (p. ej. un bloque ```json).
+    """
+
+    def __init__(self):
+        self.fields: Dict[str, Any] = {}
+        self.current_key: Optional[str] = None
+        self.done = False
+        self._state = "start"  # start | before_key | key | colon | before_value | value
+        self._chars: List[str] = []
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        """Consume un trozo y devuelve los campos (clave, valor) que se cerraron en él"""
+        closed = []
+        for char in chunk:
+            if self.done:
+                break
+            field = self._consume(char)
+            if field is not None:
+                closed.append(field)
+        return closed
+
+    def partial_value(self) -> Optional[str]:
+        """Valor de texto aún abierto del campo en curso (None si no es un string)"""
+        if self._state != "value" or not self._chars or self._chars[0] != '"' or not self._in_string:
+            return None
+        text = "".join(self._chars)
+        if self._escape:
+            text = text[:-1]
+        try:
+            return json.loads(text + '"')
+        except ValueError:
+            # Escape \\uXXXX a medias: se descarta la secuencia incompleta
+            return json.loads(text[:text.rfind("\\")] + '"')
+
+    def _consume(self, char: str) -> Optional[Tuple[str, Any]]:
+        state = self._state
+        if state == "start":
+            if char == "{":
+                self._state = "before_key"
+        elif state == "before_key":
+            if char == '"':
+                self._chars = []
+                self._escape = False
+                self._state = "key"
+            elif char == "}":
+                self.done = True
+        elif state == "key":
+            if self._escape:
+                self._escape = False
+            elif char == "\\":
+                self._escape = True
+            elif char == '"':
+                self.current_key = json.loads('"' + "".join(self._chars) + '"')
+                self._state = "colon"
+                return None
+            self._chars.append(char)
+        elif state == "colon":
+            if char == ":":
+                self._state = "before_value"
+        elif state == "before_value":
+            if char not in _WHITESPACE:
+                self._chars = [char]
+                self._depth = 1 if char in "{[" else 0
+                self._in_string = char == '"'
+                self._escape = False
+                self._state = "value"
+        else:
+            return self._consume_value(char)
+        return None
+
+    def _consume_value(self, char: str) -> Optional[Tuple[str, Any]]:
+        if self._in_string:
+            self._chars.append(char)
+            if self._escape:
+                self._escape = False
+            elif char == "\\":
+                self._escape = True
+            elif char == '"':
+                self._in_string = False
+                if self._depth == 0:
+                    return self._close_value("".join(self._chars))
+            return None
+        if self._depth == 0 and (char in ",}" or char in _WHITESPACE):
+            # Fin de un escalar (número, true, false, null)
+            field = self._close_value("".join(self._chars))
+            if char == "}":
+                self.done = True
+            return field
+        self._chars.append(char)
+        if char == '"':
+            self._in_string = True
+        elif char in "{[":
+            self._depth += 1
+        elif char in "}]":
+            self._depth -= 1
+            if self._depth == 0:
+                return self._close_value("".join(self._chars))
+        return None
+
+    def _close_value(self, raw: str) -> Tuple[str, Any]:
+        key = self.current_key
+        self.fields[key] = json.loads(raw)
+        self.current_key = None
+        self._chars = []
+        self._state = "before_key"
+        return key, self.fields[key]
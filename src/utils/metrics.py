@@ -0,0 +1,83 @@
+import time
+from collections import defaultdict, deque
+from typing import Any, Deque, Dict, Optional
+
+
+class SeriesStats:
+    """Latencias recientes y totales de tokens/llamadas de una serie (modo, grupo, nivel...)"""
+
+    def __init__(self, window: int = 500):
+        self.count = 0
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.hits = 0
+        self.hit_samples = 0
+        self._latencies: Deque[float] = deque(maxlen=window)
+
+    def record(
+        self,
+        latency: float,
+        prompt_tokens: int = 0,
+        completion_tokens: int = 0,
+        calls: int = 1,
+        hit: Optional[bool] = None
+    ):
+        """`hit` (opcional) alimenta la tasa de aciertos de la serie (p. ej. nivel de cascada aceptado)"""
+        self.count += 1
+        if hit is not None:
+            self.hit_samples += 1
+            self.hits += int(hit)
+        self.calls += calls
+        self.prompt_tokens += prompt_tokens
+        self.completion_tokens += completion_tokens
+        self._latencies.append(latency)
+
+    def latency_percentile(self, p: float) -> Optional[float]:
+        """Percentil de latencia en segundos (None sin muestras)"""
+        if not self._latencies:
+            return None
+        ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, int(p * len(ordered)))]
+
+    def _percentile_ms(self, p: float) -> Optional[float]:
+        value = self.latency_percentile(p)
+        return round(value * 1000, 1) if value is not None else None
+
+    def snapshot(self) -> Dict[str, Any]:
+        count = self.count or 1
+        snapshot = {
+            "count": self.count,
+            "latency_p50_ms": self._percentile_ms(0.50),
+            "latency_p95_ms": self._percentile_ms(0.95),
+            "avg_calls": round(self.calls / count, 2),
+            "avg_prompt_tokens": round(self.prompt_tokens / count, 1),
+            "avg_completion_tokens": round(self.completion_tokens / count, 1)
+        }
+        if self.hit_samples:
+            snapshot["hit_rate"] = round(self.hits / self.hit_samples, 3)
+        return snapshot
+
+
+class MetricsRegistry:
+    """Series de métricas en memoria agrupadas por nombre, expuestas en /metrics"""
+
+    def __init__(self):
+        self._series: Dict[str, Dict[str, SeriesStats]] = defaultdict(dict)
+        self.started_at = time.time()
+
+    def series(self, group: str, name: str) -> SeriesStats:
+        stats = self._series[group].get(name)
+        if stats is None:
+            stats = self._series[group][name] = SeriesStats()
+        return stats
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        return {
+            group: {name: stats.snapshot() for name, stats in series.items()}
+            for group, series in self._series.items()
+        }
+
+
+# Global metrics registry
+metrics = MetricsRegistry()
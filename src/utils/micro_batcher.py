@@ -0,0 +1,117 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Set, Tuple
+from src.utils.logger import logger
+
+# handler(clave, items) -> un resultado por item (None = reintentar ese item por separado)
+BatchHandler = Callable[[Hashable, List[Any]], Awaitable[List[Optional[Any]]]]
+SingleHandler = Callable[[Hashable, Any], Awaitable[Any]]
+
+
+class MicroBatcher:
+    """
+    Agrupa peticiones concurrentes con la misma clave en un solo lote: espera
+    hasta `max_wait` segundos a reunir `max_batch_size` items y llama a
+    `batch_handler` una vez. Los items sin resultado del lote (o todos, si el
+    lote falla) se resuelven con `single_handler`, salvo las excepciones de
+    `propagate`, que se entregan tal cual a cada petición.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        batch_handler: BatchHandler,
+        single_handler: SingleHandler,
+        max_batch_size: int,
+        max_wait: float,
+        propagate: Tuple[type, ...] = ()
+    ):
+        self.name = name
+        self.batch_handler = batch_handler
+        self.single_handler = single_handler
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait
+        self.propagate = propagate
+        self._pending: Dict[Hashable, List[Tuple[Any, asyncio.Future]]] = {}
+        self._timers: Dict[Hashable, asyncio.TimerHandle] = {}
+        self._tasks: Set[asyncio.Task] = set()
+        self.batches = 0
+        self.batched_items = 0
+        self.single_items = 0
+        self.fallbacks = 0
+
+    async def submit(self, key: Hashable, item: Any) -> Any:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        batch = self._pending.setdefault(key, [])
+        batch.append((item, future))
+        if len(batch) >= self.max_batch_size:
+            self._flush(key)
+        elif len(batch) == 1:
+            self._timers[key] = loop.call_later(self.max_wait, self._flush, key)
+        return await future
+
+    def _flush(self, key: Hashable):
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        batch = self._pending.pop(key, None)
+        if not batch:
+            return
+        task = asyncio.create_task(self._run(key, batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, key: Hashable, batch: List[Tuple[Any, asyncio.Future]]):
+        # Peticiones canceladas mientras esperaban no entran en el lote
+        batch = [(item, future) for item, future in batch if not future.done()]
+        if not batch:
+            return
+        if len(batch) == 1:
+            self.single_items += 1
+            await self._resolve_single(key, *batch[0])
+            return
+
+        self.batches += 1
+        self.batched_items += len(batch)
+        try:
+            results = await self.batch_handler(key, [item for item, _ in batch])
+        except self.propagate as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        except Exception as e:
+            logger.warning("Micro-batch failed, falling back to single calls", batcher=self.name, size=len(batch), error=str(e))
+            results = [None] * len(batch)
+
+        fallbacks = []
+        for (item, future), result in zip(batch, results):
+            if future.done():
+                continue
+            if result is None:
+                fallbacks.append(self._resolve_single(key, item, future))
+            else:
+                future.set_result(result)
+        if fallbacks:
+            self.fallbacks += len(fallbacks)
+            await asyncio.gather(*fallbacks)
+
+    async def _resolve_single(self, key: Hashable, item: Any, future: asyncio.Future):
+        try:
+            result = await self.single_handler(key, item)
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+            return
+        if not future.done():
+            future.set_result(result)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "batches": self.batches,
+            "batched_items": self.batched_items,
+            "avg_batch_size": round(self.batched_items / self.batches, 2) if self.batches else None,
+            "single_items": self.single_items,
+            "fallbacks": self.fallbacks,
+            "pending": sum(len(batch) for batch in self._pending.values())
+        }
@@ -1,63 +1,1086 @@
-import openai
+import asyncio
+import base64
+import hashlib
+import json
+import re
+import time
+from functools import lru_cache
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple, Union
+from openai import AsyncOpenAI
 from dotenv import load_dotenv
-import os
+from pydantic import ConfigDict, TypeAdapter, create_model
 from src.config import settings
+from src.extractor.schema import ExtractedData, OCRFields
+from src.utils.cache import get_cached_result, get_similar_result, make_cache_key, remember_phash, store_result
+from src.utils.circuit_breaker import CircuitBreaker, CircuitOpenError
+from src.utils.http_client import get_async_http_client
+from src.utils.field_regions import FIELD_REGIONS, regions_for_fields
+from src.utils.image_processing import compose_pages, crop_field_region, downscale_page, run_in_cpu_pool
+from src.utils.json_stream import IncrementalJSONParser
 from src.utils.logger import ocr_logger
+from src.utils.metrics import metrics
+from src.utils.micro_batcher import MicroBatcher
+from src.utils.phash import content_hash
+from src.utils.preprocessing import scaled_size
+from src.utils.resilience import PROVIDER_OUTAGE_ERRORS, ocr_resilience
+from src.utils.scheduler import openai_scheduler
+from src.utils.token_estimator import estimate_call, expected_output_tokens, sum_estimates, text_tokens
+from src.utils.validators import DocumentValidator
 
 load_dotenv()
-openai.api_key = settings.OPENAI_API_KEY
-
-def extract_text_and_fields_with_openai(base64_image: str) -> dict:
-    messages = [
-        {"role": "system", "content": (
-            "Eres un extractor de datos de documentos de identidad colombianos. "
-            "Recibes una imagen de un documento (cédula de ciudadanía, cédula digital, cédula de extranjería o pasaporte). "
-            "Devuelve un JSON con los siguientes campos SIEMPRE presentes (aunque sean null): "
-            "tipo_documento, numero_documento, nombres, apellidos, fecha_nacimiento, lugar_nacimiento, estatura, grupo_sanguineo, sexo, fecha_expedicion, lugar_expedicion, texto_legible. "
-            "Busca variantes de etiquetas y formatos, y si un campo no está explícito, intenta inferirlo del contexto. "
-            "Si no puedes inferir un campo, pon null. "
-            "Ignora errores menores de OCR y responde SOLO con un JSON válido."
-        )},
+
+# Cliente asíncrono compartido sobre el pool HTTP/2 con timeouts por fase;
+# los reintentos los gestiona ocr_resilience, no el SDK
+_client: Optional[AsyncOpenAI] = None
+_client_pool = None
+
+
+def get_openai_client() -> AsyncOpenAI:
+    """Devuelve el cliente, recreándolo si close_http_clients cerró su pool (p. ej. al reiniciar el lifespan)"""
+    global _client, _client_pool
+    http_client = get_async_http_client()
+    if _client is None or _client_pool is not http_client:
+        _client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY, max_retries=0, http_client=http_client)
+        _client_pool = http_client
+    return _client
+
+# Falla rápido mientras el proveedor está caído en lugar de agotar timeouts;
+# SchedulerTimeoutError (cola local llena) no cuenta como fallo
+ocr_breaker = CircuitBreaker(
+    name="openai",
+    failure_threshold=settings.CIRCUIT_FAILURE_THRESHOLD,
+    recovery_timeout=settings.CIRCUIT_RECOVERY_TIMEOUT,
+    half_open_max_calls=settings.CIRCUIT_HALF_OPEN_MAX_CALLS,
+    failure_exceptions=PROVIDER_OUTAGE_ERRORS
+)
+
+# Modos de OCR por documento:
+# - per_side: una llamada por cara, en paralelo
+# - combined: una sola llamada con todas las caras como imágenes separadas
+# - composite: una sola llamada con las caras unidas en una única imagen
+# - field_groups: una llamada corta por grupo de campos, en paralelo, con el recorte de su región
+OCR_MODES = ("per_side", "combined", "composite", "field_groups")
+# Modos de una sola llamada por documento: con una cara equivalen a per_side
+SINGLE_CALL_MODES = ("combined", "composite")
+
+# Campos estructurados que devuelve el modelo (además de texto_legible)
+OUTPUT_FIELDS = list(ExtractedData.model_fields)
+
+
+def _strict_json_schema(schema: Dict[str, Any]) -> Dict[str, Any]:
+    """Structured outputs en modo estricto exige todos los campos requeridos y sin propiedades extra"""
+    schema = dict(schema)
+    schema["required"] = list(schema["properties"])
+    schema["additionalProperties"] = False
+    if "$defs" in schema:
+        schema["$defs"] = {name: _strict_json_schema(definition) for name, definition in schema["$defs"].items()}
+    return schema
+
+
+# Con streaming y OCR_STREAM_EARLY_STOP, la llamada se corta en cuanto todos los campos
+# estructurados están cerrados: texto_legible va al final del esquema y es lo que más
+# tokens de salida consume, pero queda parcial o vacío (desactivado por defecto)
+EARLY_STOP_ENABLED = settings.OCR_STREAMING and settings.OCR_STREAM_EARLY_STOP
+
+SYSTEM_PROMPT_TEMPLATE = (
+    "Eres un extractor de datos de documentos de identidad colombianos. "
+    "Recibes una imagen de un documento (cédula de ciudadanía, cédula digital, cédula de extranjería o pasaporte). "
+    "Devuelve un JSON con los siguientes campos SIEMPRE presentes (aunque sean null): "
+    "{campos}. "
+    "Busca variantes de etiquetas y formatos, y si un campo no está explícito, intenta inferirlo del contexto. "
+    "Si no puedes inferir un campo, pon null. "
+    "Ignora errores menores de OCR y responde SOLO con un JSON válido."
+)
+
+USER_PROMPT = (
+    "Extrae todos los campos del documento y responde SOLO con un JSON válido. "
+    "Incluye los campos aunque no estén presentes en el documento."
+)
+
+COMBINED_USER_PROMPT = (
+    "Las imágenes son el frente y el respaldo del MISMO documento. "
+    "Combina la información de todas las caras en un único JSON válido y responde SOLO con él. "
+    "Incluye los campos aunque no estén presentes en el documento."
+)
+
+COMPOSITE_USER_PROMPT = (
+    "La imagen contiene el frente (arriba) y el respaldo (abajo) del MISMO documento. "
+    "Combina la información de ambas caras en un único JSON válido y responde SOLO con él. "
+    "Incluye los campos aunque no estén presentes en el documento."
+)
+
+# Solo cuando se pide la transcripción en una llamada con varias caras
+MULTI_SIDE_TEXT_PROMPT = " En texto_legible incluye el texto de todas las caras."
+
+# En per_side con frente y respaldo, cada llamada se orienta a los campos de su cara
+SIDE_USER_PROMPT = (
+    "Esta imagen es el {cara} del documento; normalmente contiene: {campos}. "
+    "Extrae los campos visibles en esta cara y pon null en los demás, sin inferirlos. "
+    "Responde SOLO con un JSON válido."
+)
+
+# Campos de cada cara (frente, respaldo) según el tipo de documento; sin tipo
+# se usa la distribución de la cédula amarilla. El esquema sigue pidiendo todos
+# los campos, así que si las caras llegan invertidas no se pierde ninguno.
+SIDE_FIELDS: Dict[str, Tuple[Tuple[str, ...], Tuple[str, ...]]] = {
+    "cedula amarilla": (
+        ("tipo_documento", "numero_documento", "nombres", "apellidos"),
+        ("fecha_nacimiento", "lugar_nacimiento", "estatura", "grupo_sanguineo", "sexo", "fecha_expedicion", "lugar_expedicion"),
+    ),
+    "cedula digital": (
+        ("tipo_documento", "numero_documento", "nombres", "apellidos", "fecha_nacimiento", "lugar_nacimiento",
+         "estatura", "grupo_sanguineo", "sexo", "fecha_expedicion", "lugar_expedicion"),
+        ("numero_documento", "nombres", "apellidos", "fecha_nacimiento", "sexo"),
+    ),
+    "cedula de extranjeria": (
+        ("tipo_documento", "numero_documento", "nombres", "apellidos", "fecha_nacimiento", "sexo"),
+        ("lugar_nacimiento", "fecha_expedicion", "lugar_expedicion", "grupo_sanguineo", "estatura"),
+    ),
+}
+SIDE_NAMES = ("FRENTE", "RESPALDO")
+
+# Grupos de campos del modo field_groups, en el orden en que se unen los resultados
+FIELD_GROUPS: Dict[str, Tuple[str, ...]] = {
+    "identidad": ("tipo_documento", "numero_documento", "nombres", "apellidos"),
+    "nacimiento": ("fecha_nacimiento", "lugar_nacimiento"),
+    "fisicos": ("estatura", "grupo_sanguineo", "sexo"),
+    "expedicion": ("fecha_expedicion", "lugar_expedicion"),
+}
+FIELD_GROUP_USER_PROMPT = (
+    "Las imágenes son las caras, o recortes de las caras, del MISMO documento. "
+    "Extrae solo estos campos: {campos}. Responde SOLO con un JSON válido."
+)
+
+# Micro-lotes: varios documentos en una llamada, separados por "Documento N"
+BATCH_SYSTEM_PROMPT = (
+    " Recibirás varios documentos independientes, cada uno precedido por \"Documento N\". "
+    "Devuelve {\"documentos\": [...]} con un objeto por documento con su id N y sus campos, "
+    "sin mezclar datos entre documentos."
+)
+
+# Re-consulta de campos faltantes sobre un recorte de su región
+REQUERY_USER_PROMPT = (
+    "Recorte ampliado del {cara} del documento. Lee solo: {campos}. "
+    "Escribe las fechas como DD/MM/AAAA. Si no aparece, pon null."
+)
+
+# Cambia automáticamente al modificar los prompts, invalidando la caché
+PROMPT_VERSION = hashlib.sha256(
+    (
+        SYSTEM_PROMPT_TEMPLATE + USER_PROMPT + COMBINED_USER_PROMPT + COMPOSITE_USER_PROMPT
+        + MULTI_SIDE_TEXT_PROMPT + SIDE_USER_PROMPT + json.dumps(SIDE_FIELDS, sort_keys=True) + REQUERY_USER_PROMPT
+        + json.dumps(FIELD_GROUPS) + FIELD_GROUP_USER_PROMPT + BATCH_SYSTEM_PROMPT
+        + settings.OCR_STRUCTURED_OUTPUT
+    ).encode()
+).hexdigest()[:12]
+
+_MODE_PROMPTS = {
+    "per_side": USER_PROMPT,
+    "combined": COMBINED_USER_PROMPT,
+    "composite": COMPOSITE_USER_PROMPT,
+}
+
+
+class OutputSpec(NamedTuple):
+    """Qué devuelve una llamada al modelo: campos, transcripción, prompt de sistema, formato y validador"""
+    fields: Tuple[str, ...]
+    include_text: bool
+    system_prompt: str
+    response_format: Optional[Dict[str, Any]]
+    adapter: TypeAdapter
+    version: str  # Parte de la clave de caché
+
+    @property
+    def output_names(self) -> List[str]:
+        return list(self.fields) + (["texto_legible"] if self.include_text else [])
+
+
+@lru_cache(maxsize=64)
+def output_spec(fields: Optional[Tuple[str, ...]] = None, include_text: bool = True) -> OutputSpec:
+    """
+    Especificación de salida para una proyección de campos. tipo_documento se
+    pide siempre porque la detección del tipo depende de él; sin transcripción
+    (include_text=False) el modelo no genera texto_legible.
+    """
+    requested = set(fields or OUTPUT_FIELDS) | {"tipo_documento"}
+    fields = tuple(field for field in OUTPUT_FIELDS if field in requested)
+    names = list(fields) + (["texto_legible"] if include_text else [])
+    if fields == tuple(OUTPUT_FIELDS) and include_text:
+        model = OCRFields
+    else:
+        model = create_model(
+            "OCRFieldsProjection",
+            __config__=ConfigDict(extra="ignore"),
+            **{name: (Optional[str], ...) for name in names}
+        )
+    adapter = TypeAdapter(model)
+    response_format = {
+        "json_schema": {
+            "type": "json_schema",
+            "json_schema": {
+                "name": "documento_identidad",
+                "strict": True,
+                "schema": _strict_json_schema(adapter.json_schema())
+            }
+        },
+        "json_object": {"type": "json_object"},
+        "none": None,
+    }[settings.OCR_STRUCTURED_OUTPUT]
+    system_prompt = SYSTEM_PROMPT_TEMPLATE.format(campos=", ".join(names))
+    version = hashlib.sha256(",".join(names).encode()).hexdigest()[:8]
+    return OutputSpec(fields, include_text, system_prompt, response_format, adapter, version)
+
+
+def _user_prompt(mode: str, spec: OutputSpec) -> str:
+    prompt = _MODE_PROMPTS[mode]
+    if mode != "per_side" and spec.include_text:
+        prompt += MULTI_SIDE_TEXT_PROMPT
+    return prompt
+
+
+def _expected_output(spec: OutputSpec, sides: int) -> int:
+    return expected_output_tokens(len(spec.fields), sides, transcription=spec.include_text and not EARLY_STOP_ENABLED)
+
+
+def side_fields(tipo_documento: Optional[str] = None) -> Tuple[Tuple[str, ...], Tuple[str, ...]]:
+    return SIDE_FIELDS.get(tipo_documento or "", SIDE_FIELDS["cedula amarilla"])
+
+
+def _side_requests(
+    sides: int,
+    spec: OutputSpec,
+    tipo_documento: Optional[str] = None
+) -> List[Tuple[str, int]]:
+    """
+    Prompt y max_tokens de cada llamada en per_side. Con frente y respaldo el
+    prompt nombra los campos de la cara y el presupuesto de salida se ajusta a
+    ellos (con margen OCR_SIDE_TOKEN_HEADROOM); con una sola cara se pide todo.
+    """
+    if sides != 2:
+        return [(USER_PROMPT, settings.OPENAI_MAX_TOKENS)] * sides
+    requests = []
+    for name, fields in zip(SIDE_NAMES, side_fields(tipo_documento)):
+        fields = [field for field in fields if field in spec.fields] or list(spec.fields)
+        # Los campos ajenos a la cara salen como null (pocos tokens cada uno)
+        expected = expected_output_tokens(len(fields), 1, transcription=spec.include_text) + 4 * len(spec.fields)
+        max_tokens = min(settings.OPENAI_MAX_TOKENS, int(expected * settings.OCR_SIDE_TOKEN_HEADROOM))
+        requests.append((SIDE_USER_PROMPT.format(cara=name, campos=", ".join(fields)), max_tokens))
+    return requests
+
+
+def _field_group_requests(spec: OutputSpec) -> List[Tuple[str, OutputSpec, str, int]]:
+    """
+    (grupo, spec, prompt, max_tokens) de cada llamada de field_groups. Solo se
+    piden los grupos con campos de la proyección; la transcripción, si se pide,
+    va en su propia llamada (con las caras completas) para no alargar las de campos.
+    """
+    requests = []
+    for name, group in FIELD_GROUPS.items():
+        fields = tuple(field for field in group if field in spec.fields)
+        if not fields or (fields == ("tipo_documento",) and name != "identidad"):
+            continue
+        group_spec = output_spec(fields, include_text=False)
+        max_tokens = min(settings.OPENAI_MAX_TOKENS, 2 * expected_output_tokens(len(group_spec.fields), 1, transcription=False))
+        prompt = FIELD_GROUP_USER_PROMPT.format(campos=", ".join(group_spec.fields))
+        requests.append((name, group_spec, prompt, max_tokens))
+    if spec.include_text:
+        text_spec = output_spec(("tipo_documento",), include_text=True)
+        prompt = FIELD_GROUP_USER_PROMPT.format(campos="texto_legible") + MULTI_SIDE_TEXT_PROMPT
+        requests.append(("texto", text_spec, prompt, settings.OPENAI_MAX_TOKENS))
+    return requests
+
+
+def _group_regions(
+    tipo_documento: Optional[str],
+    fields: Tuple[str, ...],
+    sides: int
+) -> Dict[int, Tuple[Tuple[float, float, float, float], List[str]]]:
+    """
+    Regiones a recortar para una llamada de field_groups. Sin tipo de documento
+    conocido no se recorta: la distribución por defecto de regions_for_fields
+    dejaría fuera campos de otros tipos (p. ej. el número del pasaporte).
+    """
+    if tipo_documento not in FIELD_REGIONS:
+        return {}
+    return regions_for_fields(tipo_documento, list(fields), sides)
+
+
+def _group_crop_sizes(
+    sizes: List[Optional[Tuple[int, int]]],
+    fields: Tuple[str, ...],
+    tipo_documento: Optional[str] = None
+) -> List[Optional[Tuple[int, int]]]:
+    """Tamaño de las imágenes de una llamada de field_groups: recortes de su región o, sin región, las caras"""
+    regions = _group_regions(tipo_documento, fields, len(sizes))
+    if not regions:
+        return sizes
+    crop_sizes = []
+    for side, ((x0, y0, x1, y1), _) in regions.items():
+        if sizes[side] is None:
+            crop_sizes.append(None)
+            continue
+        width, height = sizes[side]
+        crop = (max(1, round(width * (x1 - x0))), max(1, round(height * (y1 - y0))))
+        crop_sizes.append(scaled_size(crop, settings.OCR_FIELD_GROUP_LONG_EDGE))
+    return crop_sizes
+
+
+async def _group_images(
+    images_base64: List[str],
+    sizes: List[Optional[Tuple[int, int]]],
+    fields: Tuple[str, ...],
+    tipo_documento: Optional[str] = None
+) -> Tuple[List[str], List[Optional[Tuple[int, int]]]]:
+    """
+    Imágenes de una llamada de field_groups: el recorte de la región de sus campos
+    en cada cara (field_regions.py), reducido a OCR_FIELD_GROUP_LONG_EDGE. Sin tipo
+    de documento conocido o si ningún campo tiene región (p. ej. la transcripción)
+    van las caras completas.
+    """
+    regions = _group_regions(tipo_documento, fields, len(images_base64))
+    if not regions:
+        return images_base64, sizes
+    # Las caras ya vienen recortadas al documento: sin perfil no se vuelve a recortar
+    crops = await asyncio.gather(*(
+        run_in_cpu_pool(
+            crop_field_region, base64.b64decode(images_base64[side]), False, side, box, None, settings.OCR_FIELD_GROUP_LONG_EDGE
+        )
+        for side, (box, _) in regions.items()
+    ))
+    return [base64.b64encode(crop.jpeg).decode() for crop in crops], [crop.size for crop in crops]
+
+
+async def _extract_group(
+    name: str,
+    images_base64: List[str],
+    sizes: List[Optional[Tuple[int, int]]],
+    group_spec: OutputSpec,
+    prompt: str,
+    max_tokens: int,
+    detail: str,
+    tipo_documento: Optional[str] = None,
+    model: Optional[str] = None
+) -> Tuple[dict, "OCRUsage"]:
+    start = time.monotonic()
+    group_images, group_sizes = await _group_images(images_base64, sizes, group_spec.fields, tipo_documento)
+    # Sin phash: los recortes de una misma región de la plantilla se parecen entre
+    # personas distintas, así que solo se reutiliza un acierto exacto de caché
+    result, usage = await _extract_cached(group_images, prompt, None, detail, group_sizes, group_spec, max_tokens, model)
+    metrics.series("ocr_field_group", name).record(
+        time.monotonic() - start, usage.prompt_tokens, usage.completion_tokens, usage.calls
+    )
+    return result, usage
+
+
+def merge_group_results(results: List[dict], groups: List[Tuple[str, ...]], spec: OutputSpec) -> dict:
+    """Une los JSON parciales en orden fijo: cada campo sale del primer grupo que lo pide y lo trae"""
+    merged: Dict[str, Any] = dict.fromkeys(spec.output_names)
+    for result, fields in zip(results, groups):
+        for field in fields:
+            if field in merged and merged[field] is None:
+                merged[field] = result.get(field)
+    return merged
+
+
+def merge_side_results(
+    results: List[dict],
+    spec: Optional[OutputSpec] = None,
+    tipo_documento: Optional[str] = None
+) -> dict:
+    """
+    Une los resultados de las caras en un solo registro: cada campo se toma de
+    la cara donde suele estar y, si ahí viene null, de la primera que lo traiga.
+    """
+    spec = spec or output_spec()
+    if len(results) == 1:
+        return dict(results[0])
+    layout = side_fields(tipo_documento) if len(results) == 2 else ()
+    merged: Dict[str, Any] = {}
+    for field in spec.fields:
+        order = list(range(len(results)))
+        home = next((idx for idx, fields in enumerate(layout) if field in fields), None)
+        if home is not None:
+            order.remove(home)
+            order.insert(0, home)
+        merged[field] = next((results[idx].get(field) for idx in order if results[idx].get(field)), None)
+    if spec.include_text:
+        merged["texto_legible"] = "\n".join(result.get("texto_legible") or "" for result in results)
+    return merged
+
+
+def estimate_request_tokens(
+    sizes: List[Optional[Tuple[int, int]]],
+    detail: str,
+    user_prompt: str = USER_PROMPT,
+    spec: Optional[OutputSpec] = None,
+    max_tokens: Optional[int] = None,
+    model: Optional[str] = None
+) -> int:
+    """Tokens que reserva el scheduler: entrada estimada + salida máxima permitida"""
+    spec = spec or output_spec()
+    estimate = estimate_call([spec.system_prompt, user_prompt], sizes, detail, model or settings.OPENAI_MODEL, 0)
+    return estimate["input_tokens"] + (max_tokens or settings.OPENAI_MAX_TOKENS)
+
+
+def estimate_document_tokens(
+    sizes: List[Optional[Tuple[int, int]]],
+    detail: str = settings.IMAGE_DETAIL,
+    mode: Optional[str] = None,
+    model: Optional[str] = None,
+    spec: Optional[OutputSpec] = None,
+    tipo_documento: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Estimación local (sin llamar al proveedor) de tokens, coste y latencia de
+    extraer un documento con las caras de tamaño `sizes` en el modo indicado.
+    """
+    mode = mode or settings.OCR_MODE
+    if len(sizes) < 2 and mode in SINGLE_CALL_MODES:
+        mode = "per_side"
+    model = model or settings.OPENAI_MODEL
+    spec = spec or output_spec()
+    if mode == "per_side":
+        estimates = [
+            estimate_call([spec.system_prompt, prompt], [size], detail, model, min(max_tokens, _expected_output(spec, 1)))
+            for size, (prompt, max_tokens) in zip(sizes, _side_requests(len(sizes), spec))
+        ]
+    elif mode == "field_groups":
+        estimates = [
+            estimate_call(
+                [group_spec.system_prompt, prompt], _group_crop_sizes(sizes, group_spec.fields, tipo_documento), detail, model,
+                min(max_tokens, _expected_output(group_spec, len(sizes)))
+            )
+            for _, group_spec, prompt, max_tokens in _field_group_requests(spec)
+        ]
+    else:
+        call_sizes = sizes
+        if mode == "composite" and all(sizes):
+            call_sizes = [(max(w for w, _ in sizes), sum(h for _, h in sizes))]
+        estimates = [estimate_call(
+            [spec.system_prompt, _user_prompt(mode, spec)], call_sizes, detail, model, _expected_output(spec, len(sizes))
+        )]
+    estimate = sum_estimates(estimates, parallel=True)
+    # Con histórico, la latencia observada del modo es mejor predictor que la heurística
+    observed = metrics.series("ocr_mode", mode).latency_percentile(0.5)
+    if observed is not None:
+        estimate["latency_s"] = round(observed, 2)
+    return {"mode": mode, "model": model, "detail": detail, "fields": spec.output_names, **estimate}
+
+
+class OCRExtractionError(Exception):
+    """Error en la extracción OCR de una o varias caras (o grupos de campos) del documento"""
+
+    def __init__(self, message: str, failures: Optional[Dict[Union[int, str], str]] = None):
+        super().__init__(message)
+        self.failures = failures or {}
+
+
+class OCRUsage:
+    """Tokens y llamadas al proveedor consumidos por una extracción"""
+
+    __slots__ = ("prompt_tokens", "completion_tokens", "calls")
+
+    def __init__(self, prompt_tokens: int = 0, completion_tokens: int = 0, calls: int = 0):
+        self.prompt_tokens = prompt_tokens
+        self.completion_tokens = completion_tokens
+        self.calls = calls
+
+    def add(self, other: "OCRUsage"):
+        self.prompt_tokens += other.prompt_tokens
+        self.completion_tokens += other.completion_tokens
+        self.calls += other.calls
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+
+def _build_messages(
+    images_base64: List[str],
+    user_prompt: str = USER_PROMPT,
+    detail: str = "high",
+    system_prompt: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    return [
+        {"role": "system", "content": system_prompt or output_spec().system_prompt},
         {
             "role": "user",
-            "content": [
-                {"type": "text", "text": (
-                    "Extrae todos los campos del documento y responde SOLO con un JSON válido. "
-                    "Incluye los campos aunque no estén presentes en el documento. "
-                    "Ejemplo de respuesta: {\"tipo_documento\":..., \"numero_documento\":..., ...}"
-                )},
-                {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{base64_image}"}}
+            "content": [{"type": "text", "text": user_prompt}] + [
+                {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{image}", "detail": detail}}
+                for image in images_base64
             ]
         }
     ]
+
+
+def _parse_content(content: Optional[str], spec: Optional[OutputSpec] = None) -> dict:
+    """
+    Valida la respuesta del modelo contra el esquema de salida en una sola pasada. Solo sin
+    structured outputs (OCR_STRUCTURED_OUTPUT=none) se recorta el texto alrededor del JSON.
+    """
+    spec = spec or output_spec()
     try:
-        response = openai.chat.completions.create(
-            model=settings.OPENAI_MODEL,
-            messages=messages,
-            max_tokens=settings.OPENAI_MAX_TOKENS
-        )
-        content = response.choices[0].message.content
-        usage = getattr(response, "usage", None)
-        tokens_used = usage.total_tokens if usage and getattr(usage, "total_tokens", None) else None
-        ocr_logger.ocr_request(
-            image_size=len(base64_image),
-            model=settings.OPENAI_MODEL,
-            tokens_used=tokens_used
+        if spec.response_format is None and content:
+            match = re.search(r'\{.*\}', content, re.DOTALL)
+            content = match.group(0) if match else content
+        return spec.adapter.validate_json(content or "").model_dump()
+    except Exception as e:
+        ocr_logger.error("Error parsing OpenAI JSON response", error=e, raw_content=content)
+        raise
+
+
+async def extract_text_and_fields_with_openai(
+    base64_image: str,
+    phash: Optional[int] = None,
+    detail: str = settings.IMAGE_DETAIL,
+    spec: Optional[OutputSpec] = None
+) -> dict:
+    result, _ = await _extract_cached([base64_image], USER_PROMPT, phash, detail, spec=spec)
+    return result
+
+
+async def _extract_cached(
+    images_base64: List[str],
+    user_prompt: str,
+    phash: Optional[int] = None,
+    detail: str = settings.IMAGE_DETAIL,
+    sizes: Optional[List[Tuple[int, int]]] = None,
+    spec: Optional[OutputSpec] = None,
+    max_tokens: Optional[int] = None,
+    model: Optional[str] = None
+) -> Tuple[dict, OCRUsage]:
+    """Extracción con caché (memoria, disco y, para una sola imagen, hash perceptual)"""
+    spec = spec or output_spec()
+    model = model or settings.OPENAI_MODEL
+    cache_key = None
+    content = None
+    if settings.ENABLE_CACHE:
+        # El prompt y el detalle van en la versión para que la búsqueda perceptual
+        # no devuelva el resultado de otra cara o de otro nivel de la cascada
+        request_version = hashlib.sha256((user_prompt + detail).encode()).hexdigest()[:8]
+        version = f"{PROMPT_VERSION}:{spec.version}:{request_version}"
+        key_suffix = f":{model}:{version}"
+        cache_key = make_cache_key("|".join(images_base64), model, version)
+        cached = await get_cached_result(cache_key)
+        if cached is None and phash is not None and settings.PHASH_CACHE_ENABLED:
+            # Otra toma del mismo documento (recorte o luz ligeramente distintos)
+            content = await run_in_cpu_pool(content_hash, base64.b64decode(images_base64[0]))
+            cached = await get_similar_result(phash, content, key_suffix)
+        if cached is not None:
+            ocr_logger.debug("OCR cache hit", key=cache_key[:12])
+            return cached, OCRUsage()
+    # Los micro-lotes no van en streaming: con el corte anticipado activo, las llamadas
+    # que piden la transcripción van solas para que texto_legible no dependa del lote
+    batchable = (
+        ocr_batcher is not None
+        and len(images_base64) <= settings.OCR_BATCH_MAX_ITEM_IMAGES
+        and not (EARLY_STOP_ENABLED and spec.include_text)
+    )
+    if batchable:
+        result, usage = await ocr_batcher.submit(
+            (spec.fields, spec.include_text, detail, model),
+            (images_base64, user_prompt, sizes, max_tokens)
         )
-        # Intentar extraer JSON del contenido
-        import json
-        try:
-            if content and content.strip().startswith('{'):
-                return json.loads(content)
-            import re
-            match = re.search(r'\{.*\}', content, re.DOTALL) if content else None
-            if match:
-                return json.loads(match.group(0))
+    else:
+        result, usage = await _request_extraction(images_base64, user_prompt, detail, sizes, spec, max_tokens, model)
+    if cache_key:
+        await store_result(cache_key, result)
+        if content is not None:
+            remember_phash(phash, content, cache_key)
+    return result, usage
+
+
+async def _request_extraction(
+    images_base64: List[str],
+    user_prompt: str = USER_PROMPT,
+    detail: str = settings.IMAGE_DETAIL,
+    sizes: Optional[List[Tuple[int, int]]] = None,
+    spec: Optional[OutputSpec] = None,
+    max_tokens: Optional[int] = None,
+    model: Optional[str] = None
+) -> Tuple[dict, OCRUsage]:
+    spec = spec or output_spec()
+    model = model or settings.OPENAI_MODEL
+    max_tokens = max_tokens or settings.OPENAI_MAX_TOKENS
+    messages = _build_messages(images_base64, user_prompt, detail, spec.system_prompt)
+    request_args = {
+        "model": model,
+        "messages": messages,
+        "max_tokens": max_tokens,
+        **({"response_format": spec.response_format} if spec.response_format else {})
+    }
+
+    async def call_model():
+        estimated_tokens = estimate_request_tokens(
+            sizes or [None] * len(images_base64), detail, user_prompt, spec, max_tokens, model
+        )
+        async with openai_scheduler.slot(estimated_tokens) as ticket:
+            if settings.OCR_STREAMING:
+                completion = await _stream_completion(request_args, spec, estimated_tokens - max_tokens)
             else:
-                raise ValueError('No se encontró JSON en la respuesta de OpenAI')
-        except Exception as e:
-            ocr_logger.error("Error parsing OpenAI JSON response", error=e, raw_content=content)
-            raise
+                completion = await _complete(request_args, spec)
+            ticket.record_usage(completion[1].total_tokens or None)
+        return completion
+
+    try:
+        data, call_usage, stream_info = await ocr_breaker.call(lambda: ocr_resilience.call(call_model))
+        ocr_logger.ocr_request(
+            image_size=sum(len(image) for image in images_base64),
+            model=model,
+            tokens_used=call_usage.total_tokens or None,
+            images=len(images_base64),
+            image_dims=sizes,
+            detail=detail,
+            max_tokens=max_tokens,
+            fields=len(spec.fields),
+            include_text=spec.include_text,
+            prompt_tokens=call_usage.prompt_tokens,
+            completion_tokens=call_usage.completion_tokens,
+            **stream_info
+        )
+        return data, call_usage
     except Exception as e:
         ocr_logger.error("Error in OpenAI OCR extraction", error=e)
         raise
+
+
+@lru_cache(maxsize=64)
+def _batch_format(fields: Tuple[str, ...], include_text: bool) -> Tuple[TypeAdapter, Optional[Dict[str, Any]]]:
+    """Validador y response_format de un micro-lote: {"documentos": [{"id": N, ...campos}]}"""
+    spec = output_spec(fields, include_text)
+    item = create_model(
+        "OCRBatchItem",
+        __config__=ConfigDict(extra="ignore"),
+        id=(int, ...),
+        **{name: (Optional[str], ...) for name in spec.output_names}
+    )
+    adapter = TypeAdapter(create_model("OCRBatch", documentos=(List[item], ...)))
+    response_format = spec.response_format
+    if response_format and response_format["type"] == "json_schema":
+        response_format = {
+            "type": "json_schema",
+            "json_schema": {"name": "lote_documentos", "strict": True, "schema": _strict_json_schema(adapter.json_schema())}
+        }
+    return adapter, response_format
+
+
+async def _request_batch(key: Tuple, items: List[Tuple]) -> List[Optional[Tuple[dict, OCRUsage]]]:
+    """
+    Una sola llamada multimodal para varios documentos con la misma proyección,
+    detalle y modelo: el prompt de sistema se envía una vez. Devuelve None para
+    los documentos que falten en la respuesta (el micro-batcher los repite solos).
+    """
+    fields, include_text, detail, model = key
+    spec = output_spec(fields, include_text)
+    adapter, response_format = _batch_format(fields, include_text)
+    content: List[Dict[str, Any]] = []
+    estimated_tokens = 0
+    max_tokens = 0
+    for idx, (images_base64, user_prompt, sizes, item_max_tokens) in enumerate(items):
+        content.append({"type": "text", "text": f"Documento {idx}: {user_prompt}"})
+        content += [
+            {"type": "image_url", "image_url": {"url": f"data:image/jpeg;base64,{image}", "detail": detail}}
+            for image in images_base64
+        ]
+        item_max_tokens = item_max_tokens or settings.OPENAI_MAX_TOKENS
+        max_tokens += item_max_tokens
+        estimated_tokens += estimate_request_tokens(
+            sizes or [None] * len(images_base64), detail, user_prompt, spec, item_max_tokens, model
+        )
+    request_args = {
+        "model": model,
+        "messages": [
+            {"role": "system", "content": spec.system_prompt + BATCH_SYSTEM_PROMPT},
+            {"role": "user", "content": content}
+        ],
+        "max_tokens": max_tokens,
+        **({"response_format": response_format} if response_format else {})
+    }
+
+    async def call_model():
+        async with openai_scheduler.slot(estimated_tokens) as ticket:
+            response = await get_openai_client().chat.completions.create(**request_args)
+            usage = getattr(response, "usage", None)
+            ticket.record_usage(getattr(usage, "total_tokens", None))
+        return response
+
+    start = time.monotonic()
+    response = await ocr_breaker.call(lambda: ocr_resilience.call(call_model))
+    message = response.choices[0].message
+    if getattr(message, "refusal", None):
+        raise ValueError(f"El modelo rechazó la solicitud: {message.refusal}")
+    raw = message.content or ""
+    if response_format is None:
+        match = re.search(r'\{.*\}', raw, re.DOTALL)
+        raw = match.group(0) if match else raw
+    documents = {document.id: document for document in adapter.validate_json(raw).documentos}
+
+    usage = getattr(response, "usage", None)
+    prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+    completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+    metrics.series("ocr_batch", "batch").record(time.monotonic() - start, prompt_tokens, completion_tokens)
+    ocr_logger.ocr_request(
+        image_size=sum(len(image) for images_base64, _, _, _ in items for image in images_base64),
+        model=model,
+        tokens_used=prompt_tokens + completion_tokens or None,
+        batch_size=len(items),
+        returned=len(documents),
+        detail=detail,
+        prompt_tokens=prompt_tokens,
+        completion_tokens=completion_tokens
+    )
+    results: List[Optional[Tuple[dict, OCRUsage]]] = []
+    for idx in range(len(items)):
+        document = documents.get(idx)
+        if document is None:
+            results.append(None)
+            continue
+        # Tokens repartidos entre los documentos; la llamada se cuenta una sola vez
+        share = OCRUsage(prompt_tokens // len(items), completion_tokens // len(items), calls=int(idx == 0))
+        results.append((document.model_dump(exclude={"id"}), share))
+    return results
+
+
+async def _request_single(key: Tuple, item: Tuple) -> Tuple[dict, OCRUsage]:
+    fields, include_text, detail, model = key
+    images_base64, user_prompt, sizes, max_tokens = item
+    return await _request_extraction(
+        images_base64, user_prompt, detail, sizes, output_spec(fields, include_text), max_tokens, model
+    )
+
+
+ocr_batcher: Optional[MicroBatcher] = MicroBatcher(
+    name="ocr",
+    batch_handler=_request_batch,
+    single_handler=_request_single,
+    max_batch_size=settings.OCR_BATCH_SIZE,
+    max_wait=settings.OCR_BATCH_MAX_WAIT_MS / 1000,
+    propagate=(CircuitOpenError,)
+) if settings.OCR_BATCH_ENABLED else None
+
+
+async def _complete(request_args: Dict[str, Any], spec: OutputSpec) -> Tuple[dict, OCRUsage, Dict[str, Any]]:
+    """Llamada sin streaming: se espera la respuesta completa y se valida"""
+    response = await get_openai_client().chat.completions.create(**request_args)
+    message = response.choices[0].message
+    if getattr(message, "refusal", None):
+        raise ValueError(f"El modelo rechazó la solicitud: {message.refusal}")
+    usage = getattr(response, "usage", None)
+    call_usage = OCRUsage(
+        prompt_tokens=getattr(usage, "prompt_tokens", 0) or 0,
+        completion_tokens=getattr(usage, "completion_tokens", 0) or 0,
+        calls=1
+    )
+    return _parse_content(message.content, spec), call_usage, {}
+
+
+async def _stream_completion(
+    request_args: Dict[str, Any],
+    spec: OutputSpec,
+    estimated_prompt_tokens: int
+) -> Tuple[dict, OCRUsage, Dict[str, Any]]:
+    """
+    Llamada con streaming: cada campo se parsea en cuanto su valor se cierra y,
+    con OCR_STREAM_EARLY_STOP, se corta la respuesta al tener todos los campos
+    estructurados; texto_legible queda con lo recibido hasta ese momento.
+    """
+    start = time.monotonic()
+    parser = IncrementalJSONParser()
+    parts: List[str] = []
+    refusal = ""
+    usage = None
+    first_field = None
+    early_stopped = False
+    truncated = False
+    stream = await get_openai_client().chat.completions.create(**request_args, stream=True, stream_options={"include_usage": True})
+    try:
+        async for chunk in stream:
+            if chunk.usage:
+                usage = chunk.usage
+            if not chunk.choices:
+                continue
+            truncated = truncated or chunk.choices[0].finish_reason == "length"
+            delta = chunk.choices[0].delta
+            refusal += getattr(delta, "refusal", None) or ""
+            if not delta.content:
+                continue
+            parts.append(delta.content)
+            if parser.feed(delta.content) and first_field is None:
+                first_field = time.monotonic() - start
+            if EARLY_STOP_ENABLED and spec.include_text and all(field in parser.fields for field in spec.fields):
+                early_stopped = True
+                break
+    finally:
+        await stream.close()
+    if refusal:
+        raise ValueError(f"El modelo rechazó la solicitud: {refusal}")
+
+    if early_stopped or (truncated and parser.fields):
+        # Corte propio o max_tokens agotado: se usan los campos ya cerrados
+        data = {**dict.fromkeys(spec.output_names), **parser.fields}
+        if parser.current_key == "texto_legible":
+            data["texto_legible"] = parser.partial_value()
+        data = spec.adapter.validate_python(data).model_dump()
+        # Sin el último chunk no hay usage: tokens estimados a partir del prompt y del texto recibido
+        call_usage = OCRUsage(prompt_tokens=estimated_prompt_tokens, completion_tokens=text_tokens("".join(parts)), calls=1)
+    else:
+        data = _parse_content("".join(parts), spec)
+        call_usage = OCRUsage(
+            prompt_tokens=getattr(usage, "prompt_tokens", 0) or 0,
+            completion_tokens=getattr(usage, "completion_tokens", 0) or text_tokens("".join(parts)),
+            calls=1
+        )
+    latency = time.monotonic() - start
+    if first_field is not None:
+        metrics.series("ocr_stream", "first_field").record(first_field)
+    metrics.series("ocr_stream", "early_stop" if early_stopped else "complete").record(
+        latency, call_usage.prompt_tokens, call_usage.completion_tokens
+    )
+    return data, call_usage, {
+        "first_field_ms": round(first_field * 1000, 1) if first_field is not None else None,
+        "stream_ms": round(latency * 1000, 1),
+        "early_stopped": early_stopped,
+        "truncated": truncated,
+        "usage_estimated": usage is None
+    }
+
+
+def _raise_for_failures(results: List[Any], groups: Optional[List[str]] = None):
+    """Los fallos se identifican por índice de cara o, en field_groups, por nombre de grupo"""
+    circuit_errors = [result for result in results if isinstance(result, CircuitOpenError)]
+    if circuit_errors:
+        raise circuit_errors[0]
+    failures = {
+        (groups[idx] if groups else idx): f"{type(result).__name__}: {result}"
+        for idx, result in enumerate(results)
+        if isinstance(result, BaseException)
+    }
+    if not failures:
+        return
+    if groups:
+        ocr_logger.error("OCR extraction failed for some field groups", failed_groups=list(failures), total_groups=len(results))
+        raise OCRExtractionError("No se pudo extraer la información de todos los grupos de campos del documento.", failures)
+    ocr_logger.error("OCR extraction failed for some sides", failed_sides=list(failures), total_sides=len(results))
+    raise OCRExtractionError("No se pudo extraer la información de todas las caras del documento.", failures)
+
+
+async def extract_document_sides(
+    images_base64: List[str],
+    phashes: Optional[List[Optional[int]]] = None,
+    mode: Optional[str] = None,
+    detail: str = settings.IMAGE_DETAIL,
+    sizes: Optional[List[Tuple[int, int]]] = None,
+    spec: Optional[OutputSpec] = None,
+    tipo_documento: Optional[str] = None
+) -> List[dict]:
+    """
+    Extrae la información de todas las caras del documento según el modo:
+    - per_side: una llamada por cara en paralelo (latencia = la más lenta).
+    - combined/composite: una sola llamada para todo el documento; se envía una
+      vez el prompt de sistema y se hace un único viaje de ida y vuelta.
+    - field_groups: una llamada corta por grupo de campos (FIELD_GROUPS) en
+      paralelo, con solo el recorte de su región; cada una genera pocos tokens
+      y se unen en un solo resultado.
+    `spec` limita los campos pedidos y si se genera la transcripción. En
+    per_side con dos caras, cada llamada usa el prompt y el max_tokens de su
+    cara (frente primero) según `tipo_documento`; ver merge_side_results.
+    Con OCR_CASCADE_ENABLED pasa por extract_document_cascade.
+    Devuelve un resultado por llamada (uno solo en field_groups). Lanza OCRExtractionError con el detalle
+    si alguna falla, o CircuitOpenError si el backend está marcado como caído.
+    """
+    if settings.OCR_CASCADE_ENABLED:
+        return await extract_document_cascade(images_base64, phashes, mode, detail, sizes, spec, tipo_documento)
+    results, _ = await _extract_sides(images_base64, phashes, mode, detail, sizes, spec, tipo_documento)
+    return results
+
+
+async def _extract_sides(
+    images_base64: List[str],
+    phashes: Optional[List[Optional[int]]] = None,
+    mode: Optional[str] = None,
+    detail: str = settings.IMAGE_DETAIL,
+    sizes: Optional[List[Tuple[int, int]]] = None,
+    spec: Optional[OutputSpec] = None,
+    tipo_documento: Optional[str] = None,
+    model: Optional[str] = None
+) -> Tuple[List[dict], OCRUsage]:
+    mode = mode or settings.OCR_MODE
+    if len(images_base64) < 2 and mode in SINGLE_CALL_MODES:
+        mode = "per_side"
+    start = time.monotonic()
+    usage = OCRUsage()
+    phashes = phashes or [None] * len(images_base64)
+    sizes = sizes or [None] * len(images_base64)
+    spec = spec or output_spec()
+
+    if mode == "per_side":
+        side_requests = _side_requests(len(images_base64), spec, tipo_documento)
+        results = await asyncio.gather(
+            *(
+                _extract_cached([img_b64], prompt, phash, detail, [size], spec, max_tokens, model)
+                for img_b64, phash, size, (prompt, max_tokens) in zip(images_base64, phashes, sizes, side_requests)
+            ),
+            return_exceptions=True
+        )
+    elif mode == "combined":
+        results = await asyncio.gather(
+            _extract_cached(images_base64, _user_prompt(mode, spec), None, detail, sizes, spec, model=model),
+            return_exceptions=True
+        )
+    elif mode == "composite":
+        pages = [base64.b64decode(img_b64) for img_b64 in images_base64]
+        composite = await run_in_cpu_pool(compose_pages, pages)
+        results = await asyncio.gather(
+            _extract_cached(
+                [base64.b64encode(composite.jpeg).decode()],
+                _user_prompt(mode, spec),
+                composite.phash,
+                detail,
+                [composite.size],
+                spec,
+                model=model
+            ),
+            return_exceptions=True
+        )
+    elif mode == "field_groups":
+        group_requests = _field_group_requests(spec)
+        results = await asyncio.gather(
+            *(
+                _extract_group(
+                    name, images_base64, sizes, group_spec, prompt, max_tokens, detail, tipo_documento, model
+                )
+                for name, group_spec, prompt, max_tokens in group_requests
+            ),
+            return_exceptions=True
+        )
+    else:
+        raise ValueError(f"Modo de OCR no soportado: {mode}. Usa uno de {OCR_MODES}.")
+
+    _raise_for_failures(results, [name for name, _, _, _ in group_requests] if mode == "field_groups" else None)
+    for _, call_usage in results:
+        usage.add(call_usage)
+    documents = [result for result, _ in results]
+    if mode == "field_groups":
+        # Un único resultado por documento, como combined
+        groups = [group_spec.output_names for _, group_spec, _, _ in group_requests]
+        documents = [merge_group_results(documents, groups, spec)]
+    latency = time.monotonic() - start
+    metrics.series("ocr_mode", mode).record(latency, usage.prompt_tokens, usage.completion_tokens, usage.calls)
+    ocr_logger.info(
+        "OCR document extracted",
+        mode=mode,
+        model=model or settings.OPENAI_MODEL,
+        sides=len(images_base64),
+        detail=detail,
+        fields=spec.output_names,
+        calls=usage.calls,
+        latency_ms=round(latency * 1000, 1),
+        prompt_tokens=usage.prompt_tokens,
+        completion_tokens=usage.completion_tokens
+    )
+    return documents, usage
+
+
+async def requery_fields(
+    image_base64: str,
+    size: Optional[Tuple[int, int]],
+    fields: List[str],
+    side: int = 0
+) -> dict:
+    """
+    Pide al modelo solo `fields` sobre el recorte de su región, con detalle
+    alto, sin transcripción y con un max_tokens acorde a los campos pedidos.
+    Los valores que DocumentValidator rechaza se devuelven como null.
+    """
+    start = time.monotonic()
+    spec = output_spec(tuple(fields), include_text=False)
+    prompt = REQUERY_USER_PROMPT.format(cara=SIDE_NAMES[min(side, 1)], campos=", ".join(fields))
+    max_tokens = min(settings.OPENAI_MAX_TOKENS, 2 * expected_output_tokens(len(spec.fields), 1, transcription=False))
+    # Sin phash: los recortes de una misma región de la plantilla se parecen entre personas
+    result, usage = await _extract_cached([image_base64], prompt, None, "high", [size], spec, max_tokens)
+    result = {**result, **dict.fromkeys(DocumentValidator.rejected_fields(result))}
+    metrics.series("ocr_requery", "fields").record(
+        time.monotonic() - start, usage.prompt_tokens, usage.completion_tokens, usage.calls,
+        hit=all(result.get(field) for field in fields)
+    )
+    return result
+
+
+class CascadeTier(NamedTuple):
+    name: str
+    model: str
+    detail: str
+    max_long_edge: int  # 0 = caras tal como salen del preprocesamiento
+
+
+def cascade_tiers(detail: str = settings.IMAGE_DETAIL) -> List[CascadeTier]:
+    """Niveles de la cascada, del más barato al más caro"""
+    tiers = [
+        CascadeTier("fast", settings.OCR_CASCADE_FAST_MODEL or settings.OPENAI_MODEL, "low", settings.OCR_CASCADE_FAST_LONG_EDGE),
+        CascadeTier("standard", settings.OPENAI_MODEL, detail, 0),
+    ]
+    if settings.OCR_CASCADE_STRONG_MODEL and settings.OCR_CASCADE_STRONG_MODEL != settings.OPENAI_MODEL:
+        tiers.append(CascadeTier("strong", settings.OCR_CASCADE_STRONG_MODEL, "high", 0))
+    return tiers
+
+
+def cascade_missing_fields(data: dict, spec: Optional[OutputSpec] = None) -> List[str]:
+    """
+    Motivos para escalar: campos requeridos de la cascada que faltan tras
+    DocumentValidator y cualquier valor que el validador rechace.
+    """
+    spec = spec or output_spec()
+    validated = DocumentValidator.validate_extracted_data(data)
+    required = [field.strip() for field in settings.OCR_CASCADE_REQUIRED_FIELDS.split(",") if field.strip()]
+    missing = [field for field in required if field in spec.fields and field not in validated]
+    return missing + [field for field in DocumentValidator.rejected_fields(data) if field not in missing]
+
+
+async def extract_document_cascade(
+    images_base64: List[str],
+    phashes: Optional[List[Optional[int]]] = None,
+    mode: Optional[str] = None,
+    detail: str = settings.IMAGE_DETAIL,
+    sizes: Optional[List[Tuple[int, int]]] = None,
+    spec: Optional[OutputSpec] = None,
+    tipo_documento: Optional[str] = None
+) -> List[dict]:
+    """
+    Cascada de modelos: el primer nivel usa el modelo más barato con detail low
+    y las caras reducidas; solo si DocumentValidator descarta o no recibe los
+    campos requeridos se repite con el siguiente nivel (detalle alto / modelo
+    más fuerte). Cada nivel registra su tasa de aceptación en /metrics.
+    """
+    spec = spec or output_spec()
+    tiers = cascade_tiers(detail)
+    for level, tier in enumerate(tiers):
+        tier_images, tier_phashes, tier_sizes = images_base64, phashes, sizes
+        if tier.max_long_edge:
+            pages = await asyncio.gather(*(
+                run_in_cpu_pool(downscale_page, base64.b64decode(image), tier.max_long_edge)
+                for image in images_base64
+            ))
+            tier_images = [base64.b64encode(page.jpeg).decode() for page in pages]
+            tier_phashes = [page.phash for page in pages]
+            tier_sizes = [page.size for page in pages]
+        start = time.monotonic()
+        is_last = level == len(tiers) - 1
+        try:
+            results, usage = await _extract_sides(
+                tier_images, tier_phashes, mode, tier.detail, tier_sizes, spec, tipo_documento, tier.model
+            )
+        except OCRExtractionError:
+            # Un fallo en un nivel barato (p. ej. JSON truncado) también se escala
+            if is_last:
+                raise
+            metrics.series("ocr_cascade", tier.name).record(time.monotonic() - start, calls=0, hit=False)
+            continue
+        missing = cascade_missing_fields(merge_side_results(results, spec, tipo_documento), spec)
+        accepted = not missing or is_last
+        metrics.series("ocr_cascade", tier.name).record(
+            time.monotonic() - start, usage.prompt_tokens, usage.completion_tokens, usage.calls, hit=not missing
+        )
+        ocr_logger.info("OCR cascade tier", tier=tier.name, model=tier.model, detail=tier.detail, missing=missing, accepted=accepted)
+        if accepted:
+            return results
+    return results
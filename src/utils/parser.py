@@ -31,12 +31,16 @@ CAMPOS_REQUERIDOS = [
     "lugar_expedicion"
 ]
 
-def detectar_tipo_documento(text: str) -> Tuple[str, Optional[str]]:
-    text_lower = text.lower()
-    for tipo, patrones in TIPO_PATRONES.items():
-        for patron in patrones:
-            if patron in text_lower:
-                return tipo, None
+def detectar_tipo_documento(text: str, tipo_declarado: Optional[str] = None) -> Tuple[str, Optional[str]]:
+    # Primero el tipo que devolvió el modelo: la transcripción puede venir truncada
+    for candidato in (tipo_declarado, text):
+        if not candidato:
+            continue
+        candidato_lower = candidato.lower()
+        for tipo, patrones in TIPO_PATRONES.items():
+            for patron in patrones:
+                if patron in candidato_lower:
+                    return tipo, None
     return "desconocido", "Tipo de documento no reconocido o no soportado."
 
 def extract_entities(text: str, raw_data: Optional[Dict[str, Any]] = None) -> Dict[str, Union[str, None]]:
@@ -51,7 +55,7 @@ def extract_entities(text: str, raw_data: Optional[Dict[str, Any]] = None) -> Di
         for campo in CAMPOS_REQUERIDOS:
             if campo in validated:
                 entities[campo] = validated[campo]
-        tipo_detectado, advertencia = detectar_tipo_documento(text)
+        tipo_detectado, advertencia = detectar_tipo_documento(text, raw_data.get("tipo_documento"))
         entities["tipo_documento"] = tipo_detectado
     else:
         import re
@@ -0,0 +1,114 @@
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+
+
+def dhash(img, hash_size: int = 16) -> int:
+    """
+    Hash perceptual por diferencias (dHash) de una imagen PIL: escala de grises
+    reducida a (hash_size + 1) x hash_size y comparación de píxeles vecinos.
+    Imágenes casi iguales (otra toma, leve cambio de luz) difieren en pocos bits.
+    """
+    from PIL import Image
+    small = img.convert("L").resize((hash_size + 1, hash_size), Image.LANCZOS)
+    pixels = np.asarray(small, dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).flatten()
+    return int("".join("1" if bit else "0" for bit in bits), 2)
+
+
+def content_hash(image_bytes: bytes, hash_size: int = 64) -> int:
+    """
+    dHash de alta resolución de una imagen codificada: confirma que un acierto
+    perceptual es el mismo documento. A 16x16 el hash refleja sobre todo la
+    plantilla; a 64x64 ya cambian los trazos del nombre y del número.
+    """
+    import io
+    from PIL import Image
+    return dhash(Image.open(io.BytesIO(image_bytes)), hash_size)
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+class _BKNode:
+    __slots__ = ("hash", "key", "children")
+
+    def __init__(self, hash_value: int, key: str):
+        self.hash = hash_value
+        self.key = key
+        self.children: Dict[int, "_BKNode"] = {}
+
+
+class PerceptualIndex:
+    """
+    Índice BK-tree sobre los hashes perceptuales recientes, para encontrar en
+    O(log n) la entrada de caché más parecida dentro de una distancia máxima.
+    Guarda solo las `max_entries` más recientes; el árbol se reconstruye cuando
+    acumula demasiadas entradas retiradas. Cada entrada lleva además su
+    content_hash para confirmar el acierto antes de reutilizarlo.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, int]" = OrderedDict()  # cache key -> hash
+        self._content: Dict[str, int] = {}  # cache key -> content_hash
+        self._root: Optional[_BKNode] = None
+        self._stale = 0
+        self.near_hits = 0
+        self.rejected = 0
+
+    def add(self, hash_value: int, key: str, content: int):
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            return
+        self._entries[key] = hash_value
+        self._content[key] = content
+        self._insert(hash_value, key)
+        while len(self._entries) > self.max_entries:
+            old_key, _ = self._entries.popitem(last=False)
+            self._content.pop(old_key, None)
+            self._stale += 1
+        if self._stale > self.max_entries // 10:
+            self._rebuild()
+
+    def _insert(self, hash_value: int, key: str):
+        if self._root is None:
+            self._root = _BKNode(hash_value, key)
+            return
+        node = self._root
+        while True:
+            distance = hamming_distance(hash_value, node.hash)
+            child = node.children.get(distance)
+            if child is None:
+                node.children[distance] = _BKNode(hash_value, key)
+                return
+            node = child
+
+    def _rebuild(self):
+        self._root = None
+        self._stale = 0
+        for key, hash_value in self._entries.items():
+            self._insert(hash_value, key)
+
+    def find(self, hash_value: int, max_distance: int) -> Optional[Tuple[str, int]]:
+        """Devuelve (cache key, distancia) del vecino más cercano, o None"""
+        best: Optional[Tuple[str, int]] = None
+        pending: List[_BKNode] = [self._root] if self._root else []
+        while pending:
+            node = pending.pop()
+            distance = hamming_distance(hash_value, node.hash)
+            if distance <= max_distance and node.key in self._entries and self._entries[node.key] == node.hash:
+                if best is None or distance < best[1]:
+                    best = (node.key, distance)
+            for edge, child in node.children.items():
+                if distance - max_distance <= edge <= distance + max_distance:
+                    pending.append(child)
+        return best
+
+    def content_matches(self, key: str, content: int, max_distance: int) -> bool:
+        stored = self._content.get(key)
+        return stored is not None and hamming_distance(stored, content) <= max_distance
+
+    def stats(self) -> Dict[str, int]:
+        return {"entries": len(self._entries), "near_hits": self.near_hits, "rejected": self.rejected}
@@ -0,0 +1,59 @@
+from typing import Any, Dict, List, Optional, Tuple
+from src.config import settings
+
+# Perfiles de preprocesamiento por tipo de documento. El coste en tokens de
+# visión depende del número de teselas de 512 px tras el escalado del proveedor,
+# así que reducir el lado largo y el nivel de detalle recorta tokens y latencia.
+# - max_long_edge: lado largo máximo en píxeles (0 = sin límite)
+# - grayscale: convertir a escala de grises (menos bytes subidos; los tokens no cambian)
+# - detail: nivel de detalle de la imagen para el modelo ("low", "high" o "auto")
+# - jpeg_quality: calidad de la re-codificación JPEG
+# - crop: recortar al documento y corregir la perspectiva antes de escalar
+DEFAULT_PROFILE: Dict[str, Any] = {
+    "crop": settings.IMAGE_AUTO_CROP,
+    "max_long_edge": settings.IMAGE_MAX_LONG_EDGE,
+    "grayscale": settings.IMAGE_GRAYSCALE,
+    "detail": settings.IMAGE_DETAIL,
+    "jpeg_quality": settings.IMAGE_JPEG_QUALITY,
+}
+
+PREPROCESSING_PROFILES: Dict[str, Dict[str, Any]] = {
+    # Tarjetas ID-1 con texto grande: 1024 px bastan para leerlas con detalle alto
+    "cedula amarilla": {**DEFAULT_PROFILE, "max_long_edge": min(1024, settings.IMAGE_MAX_LONG_EDGE or 1024)},
+    "cedula digital": {**DEFAULT_PROFILE, "max_long_edge": min(1024, settings.IMAGE_MAX_LONG_EDGE or 1024)},
+    "cedula de extranjeria": {**DEFAULT_PROFILE, "max_long_edge": min(1024, settings.IMAGE_MAX_LONG_EDGE or 1024)},
+    # Página de datos del pasaporte (con MRZ de letra pequeña): se conserva más resolución
+    "pasaporte": {**DEFAULT_PROFILE, "max_long_edge": min(1536, settings.IMAGE_MAX_LONG_EDGE or 1536), "grayscale": False},
+}
+
+
+# Ajustes progresivamente más baratos cuando la estimación supera OCR_TOKEN_BUDGET
+BUDGET_FALLBACK_OVERRIDES: List[Dict[str, Any]] = [
+    {"max_long_edge": 768},
+    {"max_long_edge": 512, "detail": "low"},
+]
+
+
+def get_profile(tipo_documento: Optional[str] = None, overrides: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    return {**PREPROCESSING_PROFILES.get(tipo_documento or "", DEFAULT_PROFILE), **(overrides or {})}
+
+
+def scaled_size(size: Tuple[int, int], max_long_edge: int) -> Tuple[int, int]:
+    """Tamaño que tendría una imagen ya procesada si se reduce a `max_long_edge` (misma regla que apply_profile)"""
+    width, height = size
+    if not max_long_edge or max(size) <= max_long_edge:
+        return size
+    scale = max_long_edge / max(size)
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def apply_profile(img, profile: Dict[str, Any]):
+    """Escala la imagen PIL al lado largo máximo y la pasa a grises si el perfil lo indica"""
+    from PIL import Image
+    max_long_edge = profile.get("max_long_edge") or 0
+    if max_long_edge and max(img.size) > max_long_edge:
+        scale = max_long_edge / max(img.size)
+        img = img.resize((max(1, round(img.width * scale)), max(1, round(img.height * scale))), Image.LANCZOS)
+    if profile.get("grayscale"):
+        img = img.convert("L")
+    return img
@@ -0,0 +1,149 @@
+import asyncio
+import random
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional
+import openai
+from src.config import settings
+from src.utils.logger import ocr_logger
+
+# Errores del proveedor que vale la pena reintentar
+TRANSIENT_ERRORS = (
+    openai.RateLimitError,
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.InternalServerError,
+)
+# Errores que indican caída del proveedor y abren el circuit breaker; un 429 o una
+# espera agotada en la cola local son contrapresión, no caída
+PROVIDER_OUTAGE_ERRORS = (
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.InternalServerError,
+)
+
+
+class LatencyTracker:
+    """Percentiles de latencia sobre las últimas N llamadas exitosas"""
+
+    def __init__(self, size: int = 200):
+        self._samples: Deque[float] = deque(maxlen=size)
+
+    def record(self, latency: float):
+        self._samples.append(latency)
+
+    def percentile(self, p: float) -> Optional[float]:
+        if len(self._samples) < 20:  # Sin suficientes muestras no se estima
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(p * len(ordered)))]
+
+
+class HedgeBudget:
+    """
+    Cubo de créditos: cada llamada primaria suma `max_fraction` créditos y cada
+    hedge consume uno, así los hedges nunca superan esa fracción del tráfico.
+    """
+
+    def __init__(self, max_fraction: float, burst: float = 10.0):
+        self.max_fraction = max_fraction
+        self.burst = burst
+        self.credits = 0.0
+
+    def on_request(self):
+        self.credits = min(self.burst, self.credits + self.max_fraction)
+
+    def try_spend(self) -> bool:
+        if self.credits >= 1.0:
+            self.credits -= 1.0
+            return True
+        return False
+
+
+class ResiliencePolicy:
+    """
+    Reintentos con backoff exponencial y jitter completo ante errores transitorios
+    y, opcionalmente, hedging: si la llamada supera el p95 de latencia se lanza
+    un duplicado y se usa la primera respuesta válida.
+    """
+
+    def __init__(self):
+        self.latency = LatencyTracker()
+        self.hedge_budget = HedgeBudget(settings.OCR_HEDGE_MAX_FRACTION)
+        self.retries = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    async def call(self, func: Callable[[], Awaitable[Any]]) -> Any:
+        attempt = 0
+        while True:
+            try:
+                return await self._hedged(func)
+            except TRANSIENT_ERRORS as e:
+                if attempt >= settings.OCR_MAX_RETRIES:
+                    raise
+                delay = random.uniform(0, min(settings.OCR_RETRY_MAX_DELAY, settings.OCR_RETRY_BASE_DELAY * 2 ** attempt))
+                attempt += 1
+                self.retries += 1
+                ocr_logger.warning("Retrying OCR call", attempt=attempt, delay_s=round(delay, 3), error_type=type(e).__name__)
+                await asyncio.sleep(delay)
+
+    async def _timed(self, func: Callable[[], Awaitable[Any]]) -> Any:
+        start = time.monotonic()
+        result = await func()
+        self.latency.record(time.monotonic() - start)
+        return result
+
+    def _hedge_delay(self) -> Optional[float]:
+        if not settings.OCR_HEDGING_ENABLED:
+            return None
+        p95 = self.latency.percentile(settings.OCR_HEDGE_PERCENTILE)
+        return max(settings.OCR_HEDGE_MIN_DELAY, p95) if p95 is not None else None
+
+    async def _hedged(self, func: Callable[[], Awaitable[Any]]) -> Any:
+        self.hedge_budget.on_request()
+        delay = self._hedge_delay()
+        primary = asyncio.create_task(self._timed(func))
+        if delay is None:
+            return await primary
+
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=delay)
+        except asyncio.CancelledError:
+            # asyncio.wait no cancela la tarea: sin esto seguiría ocupando un hueco del scheduler
+            primary.cancel()
+            raise
+        if done or not self.hedge_budget.try_spend():
+            return await primary
+
+        self.hedges += 1
+        ocr_logger.info("Hedging slow OCR call", delay_s=round(delay, 3))
+        hedge = asyncio.create_task(self._timed(func))
+        pending = {primary, hedge}
+        error: Optional[BaseException] = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            self.hedge_wins += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        p95 = self.latency.percentile(0.95)
+        return {
+            "retries": self.retries,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "latency_p95_s": round(p95, 3) if p95 is not None else None
+        }
+
+
+# Global policy for OCR calls
+ocr_resilience = ResiliencePolicy()
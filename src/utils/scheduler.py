@@ -0,0 +1,175 @@
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, Deque, Dict, List, Optional, Tuple
+import openai
+from src.config import settings
+from src.utils.logger import ocr_logger
+
+
+class SchedulerTimeoutError(Exception):
+    """La solicitud esperó en cola más de lo permitido por el scheduler"""
+    pass
+
+
+class RateBudget:
+    """Ventana deslizante de 60 s para los presupuestos de RPM y TPM del proveedor (0 = sin límite)"""
+
+    WINDOW = 60.0
+
+    def __init__(self, rpm: int, tpm: int):
+        self.rpm = rpm
+        self.tpm = tpm
+        self._requests: Deque[List[float]] = deque()  # [timestamp, tokens]
+        self._tokens = 0.0
+
+    def _purge(self, now: float):
+        while self._requests and self._requests[0][0] <= now - self.WINDOW:
+            _, tokens = self._requests.popleft()
+            self._tokens -= tokens
+
+    def try_reserve(self, tokens: float) -> Tuple[Optional[List[float]], float]:
+        """Reserva si hay presupuesto; si no, devuelve cuántos segundos esperar"""
+        now = time.monotonic()
+        self._purge(now)
+        # Una solicitud mayor que todo el TPM solo espera a que la ventana quede vacía
+        tokens_fit = not self.tpm or self._tokens + tokens <= self.tpm or not self._requests
+        requests_fit = not self.rpm or len(self._requests) < self.rpm
+        if requests_fit and tokens_fit:
+            entry = [now, tokens]
+            self._requests.append(entry)
+            self._tokens += tokens
+            return entry, 0.0
+        return None, max(0.01, self._requests[0][0] + self.WINDOW - now)
+
+    def reconcile(self, entry: List[float], actual: float):
+        """Sustituye la estimación de una reserva por los tokens reales consumidos"""
+        if any(reserved is entry for reserved in self._requests):
+            self._tokens += actual - entry[1]
+            entry[1] = actual
+
+    def usage(self) -> Dict[str, float]:
+        self._purge(time.monotonic())
+        return {"requests_last_minute": len(self._requests), "tokens_last_minute": round(self._tokens)}
+
+
+class AIMDLimiter:
+    """
+    Límite de concurrencia adaptativo (additive increase / multiplicative decrease):
+    crece +1 por "ronda" de respuestas rápidas y se reduce a la mitad ante un 429
+    o una latencia por encima del objetivo (como mucho una vez por ventana).
+    """
+
+    def __init__(self, initial: int, minimum: int, maximum: int, latency_target: float):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.latency_target = latency_target
+        self.in_flight = 0
+        self._condition = asyncio.Condition()
+        self._last_decrease = 0.0
+
+    async def acquire(self):
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+
+    async def release(self, latency: Optional[float], throttled: bool):
+        async with self._condition:
+            self.in_flight -= 1
+            now = time.monotonic()
+            overloaded = throttled or (latency is not None and latency > self.latency_target)
+            if overloaded:
+                if now - self._last_decrease > self.latency_target:
+                    self.limit = max(self.minimum, self.limit / 2)
+                    self._last_decrease = now
+                    ocr_logger.warning("OpenAI concurrency decreased", limit=int(self.limit), throttled=throttled, latency=latency)
+            elif latency is not None:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            self._condition.notify_all()
+
+
+class Ticket:
+    def __init__(self, estimated_tokens: float, reservation: List[float]):
+        self.estimated_tokens = estimated_tokens
+        self.reservation = reservation
+        self.actual_tokens: Optional[int] = None
+
+    def record_usage(self, tokens: Optional[int]):
+        self.actual_tokens = tokens
+
+
+class OpenAIScheduler:
+    """
+    Scheduler delante del cliente OCR: las solicitudes esperan brevemente en cola
+    hasta que hay presupuesto de RPM/TPM y un hueco de concurrencia, en lugar de
+    lanzarse todas a la vez y fallar con 429.
+    """
+
+    def __init__(self):
+        self.budget = RateBudget(settings.OPENAI_RPM_LIMIT, settings.OPENAI_TPM_LIMIT)
+        self.limiter = AIMDLimiter(
+            initial=settings.OPENAI_INITIAL_CONCURRENCY,
+            minimum=settings.OPENAI_MIN_CONCURRENCY,
+            maximum=settings.OPENAI_MAX_CONCURRENCY,
+            latency_target=settings.OPENAI_LATENCY_TARGET
+        )
+        self._budget_lock = asyncio.Lock()
+        self.queued = 0
+        self.throttled = 0
+        self.timeouts = 0
+
+    async def _wait_for_budget(self, tokens: float) -> List[float]:
+        async with self._budget_lock:  # FIFO: nadie se adelanta a quien ya espera
+            while True:
+                reservation, delay = self.budget.try_reserve(tokens)
+                if reservation is not None:
+                    return reservation
+                await asyncio.sleep(delay)
+
+    @asynccontextmanager
+    async def slot(self, estimated_tokens: float):
+        self.queued += 1
+        try:
+            reservation = await asyncio.wait_for(self._admit(estimated_tokens), timeout=settings.SCHEDULER_MAX_QUEUE_WAIT)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise SchedulerTimeoutError("Demasiadas solicitudes de OCR en cola; intenta de nuevo en unos segundos.")
+        finally:
+            self.queued -= 1
+
+        ticket = Ticket(estimated_tokens, reservation)
+        start = time.monotonic()
+        latency: Optional[float] = None
+        throttled = False
+        try:
+            yield ticket
+            latency = time.monotonic() - start
+        except openai.RateLimitError:
+            throttled = True
+            self.throttled += 1
+            raise
+        finally:
+            await self.limiter.release(latency, throttled)
+            if ticket.actual_tokens is not None:
+                self.budget.reconcile(ticket.reservation, ticket.actual_tokens)
+
+    async def _admit(self, tokens: float) -> List[float]:
+        reservation = await self._wait_for_budget(tokens)
+        await self.limiter.acquire()
+        return reservation
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "concurrency_limit": int(self.limiter.limit),
+            "in_flight": self.limiter.in_flight,
+            "queued": self.queued,
+            "throttled": self.throttled,
+            "queue_timeouts": self.timeouts,
+            **self.budget.usage()
+        }
+
+
+# Global scheduler instance
+openai_scheduler = OpenAIScheduler()
@@ -0,0 +1,30 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict
+from src.utils.logger import logger
+
+
+class SingleFlight:
+    """
+    Agrupa llamadas concurrentes con la misma clave: la primera ejecuta el
+    trabajo y las demás esperan el mismo resultado (o la misma excepción).
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.coalesced = 0
+
+    async def do(self, key: str, func: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(func())
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.coalesced += 1
+            logger.info("Coalesced in-flight request", flight=self.name, key=key[:12])
+        # shield: si un cliente se desconecta no cancela el trabajo de los demás
+        return await asyncio.shield(task)
+
+    def stats(self) -> Dict[str, int]:
+        return {"inflight": len(self._inflight), "coalesced": self.coalesced}
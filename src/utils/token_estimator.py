@@ -0,0 +1,95 @@
+import math
+from typing import Any, Dict, List, Optional, Tuple
+
+# Coste de imagen y precios (USD por millón de tokens) por familia de modelo.
+# Imagen: `base` tokens por imagen + `tile` tokens por tesela de 512 px (detail high).
+MODEL_PROFILES: Dict[str, Dict[str, float]] = {
+    "gpt-4o-mini": {"base": 2833, "tile": 5667, "input_price": 0.15, "output_price": 0.60},
+    "gpt-4o": {"base": 85, "tile": 170, "input_price": 2.50, "output_price": 10.00},
+    "gpt-4.1-mini": {"base": 85, "tile": 170, "input_price": 0.40, "output_price": 1.60},
+    "gpt-4.1": {"base": 85, "tile": 170, "input_price": 2.00, "output_price": 8.00},
+}
+DEFAULT_MODEL_PROFILE = MODEL_PROFILES["gpt-4o"]
+
+# Sobrecoste fijo por mensaje del formato de chat
+MESSAGE_OVERHEAD_TOKENS = 7
+# Salida esperada: JSON con los campos (~12 tokens por campo) y transcripción por cara
+FIELD_OUTPUT_TOKENS = 12
+TRANSCRIPTION_TOKENS_PER_SIDE = 220
+# Velocidad de generación aproximada para estimar latencia cuando no hay histórico
+OUTPUT_TOKENS_PER_SECOND = 60.0
+BASE_LATENCY_SECONDS = 0.8
+
+
+def model_profile(model: str) -> Dict[str, float]:
+    """Perfil del modelo; los nombres con fecha (gpt-4o-2024-08-06) usan su familia"""
+    for name in sorted(MODEL_PROFILES, key=len, reverse=True):
+        if model == name or model.startswith(name + "-"):
+            return MODEL_PROFILES[name]
+    return DEFAULT_MODEL_PROFILE
+
+
+def text_tokens(text: str) -> int:
+    """Aproximación sin tokenizador: ~3.5 caracteres por token en español"""
+    return math.ceil(len(text) / 3.5)
+
+
+def image_tokens(size: Optional[Tuple[int, int]], detail: str, model: str) -> int:
+    """
+    Tokens de una imagen según el escalado del proveedor: con detail "low" solo
+    el coste base; con "high"/"auto" se ajusta a 2048x2048, el lado corto a
+    768 px y se cuentan teselas de 512 px.
+    """
+    profile = model_profile(model)
+    if detail == "low":
+        return int(profile["base"])
+    width, height = size or (1024, 768)
+    scale = min(1.0, 2048 / max(width, height))
+    width, height = width * scale, height * scale
+    scale = min(1.0, 768 / min(width, height))
+    width, height = width * scale, height * scale
+    tiles = math.ceil(width / 512) * math.ceil(height / 512)
+    return int(profile["base"] + profile["tile"] * tiles)
+
+
+def expected_output_tokens(fields: int, sides: int, transcription: bool = True) -> int:
+    tokens = fields * FIELD_OUTPUT_TOKENS + 10
+    if transcription:
+        tokens += TRANSCRIPTION_TOKENS_PER_SIDE * sides
+    return tokens
+
+
+def estimate_call(
+    prompt_texts: List[str],
+    sizes: List[Optional[Tuple[int, int]]],
+    detail: str,
+    model: str,
+    output_tokens: int
+) -> Dict[str, Any]:
+    """Estimación de una llamada: tokens de prompt, de imagen, de salida, coste y latencia"""
+    profile = model_profile(model)
+    prompt = sum(text_tokens(text) for text in prompt_texts) + MESSAGE_OVERHEAD_TOKENS * len(prompt_texts)
+    images = sum(image_tokens(size, detail, model) for size in sizes)
+    cost = ((prompt + images) * profile["input_price"] + output_tokens * profile["output_price"]) / 1_000_000
+    return {
+        "prompt_tokens": prompt,
+        "image_tokens": images,
+        "input_tokens": prompt + images,
+        "output_tokens": output_tokens,
+        "total_tokens": prompt + images + output_tokens,
+        "cost_usd": round(cost, 6),
+        "latency_s": round(BASE_LATENCY_SECONDS + output_tokens / OUTPUT_TOKENS_PER_SECOND, 2)
+    }
+
+
+def sum_estimates(estimates: List[Dict[str, Any]], parallel: bool) -> Dict[str, Any]:
+    """Agrega llamadas de un documento; en paralelo la latencia es la de la más lenta"""
+    total: Dict[str, Any] = {key: 0 for key in ("prompt_tokens", "image_tokens", "input_tokens", "output_tokens", "total_tokens")}
+    for estimate in estimates:
+        for key in total:
+            total[key] += estimate[key]
+    total["cost_usd"] = round(sum(estimate["cost_usd"] for estimate in estimates), 6)
+    latencies = [estimate["latency_s"] for estimate in estimates] or [0.0]
+    total["latency_s"] = max(latencies) if parallel else round(sum(latencies), 2)
+    total["calls"] = len(estimates)
+    return total
@@ -1,7 +1,7 @@
 import base64
 import io
 import re
-from typing import Optional, Tuple, Dict, Any
+from typing import Optional, Tuple, Dict, Any, List
 from PIL import Image
 from src.config import settings
 from src.utils.logger import logger
@@ -83,6 +83,10 @@ class DocumentValidator:
     """Validator for document-related data"""
     
     DOCUMENT_TYPES = {'cedula', 'pasaporte', 'licencia', 'tarjeta_identidad'}
+    TEXT_FIELDS = ['nombres', 'apellidos', 'lugar_nacimiento', 'lugar_expedicion']
+    DATE_FIELDS = ['fecha_nacimiento', 'fecha_expedicion']
+    # Campos que validate_extracted_data revisa (y puede rechazar)
+    VALIDATED_FIELDS = ['tipo_documento', 'numero_documento'] + TEXT_FIELDS + DATE_FIELDS
     
     @staticmethod
     def validate_filename(filename: str) -> str:
@@ -120,8 +124,7 @@ class DocumentValidator:
             validated_data['tipo_documento'] = doc_type
         
         # Validate and sanitize text fields
-        text_fields = ['nombres', 'apellidos', 'lugar_nacimiento', 'lugar_expedicion']
-        for field in text_fields:
+        for field in DocumentValidator.TEXT_FIELDS:
             if field in data and data[field]:
                 # Remove potentially dangerous characters
                 clean_value = re.sub(r'[<>"\']', '', str(data[field]))
@@ -136,8 +139,7 @@ class DocumentValidator:
                 validated_data['numero_documento'] = doc_num
         
         # Validate dates
-        date_fields = ['fecha_nacimiento', 'fecha_expedicion']
-        for field in date_fields:
+        for field in DocumentValidator.DATE_FIELDS:
             if field in data and data[field]:
                 date_value = DocumentValidator._validate_date(data[field])
                 if date_value:
@@ -145,6 +147,15 @@ class DocumentValidator:
         
         return validated_data
     
+    @staticmethod
+    def rejected_fields(data: Dict[str, Any]) -> List[str]:
+        """Fields with a value in `data` that validate_extracted_data drops"""
+        validated = DocumentValidator.validate_extracted_data(data)
+        return [
+            field for field in DocumentValidator.VALIDATED_FIELDS
+            if data.get(field) and field not in validated
+        ]
+    
     @staticmethod
     def _validate_date(date_str: str) -> Optional[str]:
         """Validate date format"""
@@ -0,0 +1,5 @@
+import os
+
+# Valores mínimos para instanciar Settings sin .env (no se llama a servicios externos)
+os.environ.setdefault("OPENAI_API_KEY", "sk-test")
+os.environ.setdefault("DB_PASSWORD", "test")
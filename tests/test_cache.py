@@ -0,0 +1,48 @@
+import json
+import pytest
+
+pytest.importorskip("pydantic_settings")
+
+from src.utils.cache import OCRCache  # noqa: E402
+
+
+def entry_size(key, value):
+    return len(json.dumps(value).encode()) + len(key)
+
+
+def test_frequent_victim_is_kept_over_new_key():
+    value = {"campo": "x" * 20}
+    cache = OCRCache(max_bytes=entry_size("a", value) * 2, ttl=60)
+    cache.set("a", value)
+    cache.set("b", value)
+    for _ in range(3):
+        assert cache.get("a") == value
+    # "a" se leyó tras "b": la víctima LRU es "b", que no se pidió nunca
+    cache.set("c", value)
+    assert cache.get("b") is None
+    assert cache.get("c") == value
+    assert cache.evictions == 1
+
+
+def test_new_key_rejected_when_lru_victim_is_more_frequent():
+    value = {"campo": "x" * 20}
+    cache = OCRCache(max_bytes=entry_size("a", value) * 2, ttl=60)
+    cache.set("a", value)
+    cache.set("b", value)
+    for _ in range(3):
+        cache.get("a")
+        cache.get("b")
+    cache.set("c", value)
+    assert cache.rejections == 1
+    assert cache.get("c") is None
+    assert cache.get("a") == value and cache.get("b") == value
+
+
+def test_oversized_entry_and_expiration():
+    cache = OCRCache(max_bytes=50, ttl=0)
+    cache.set("grande", {"campo": "x" * 100})
+    assert cache.rejections == 1
+    cache.set("a", {"v": 1})
+    assert cache.get("a") is None
+    assert cache.expirations == 1
+    assert cache.current_bytes == 0
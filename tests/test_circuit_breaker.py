@@ -0,0 +1,107 @@
+import asyncio
+import pytest
+
+pytest.importorskip("pydantic_settings")
+
+from src.utils import circuit_breaker  # noqa: E402
+from src.utils.circuit_breaker import CircuitBreaker, CircuitOpenError  # noqa: E402
+
+
+class Outage(Exception):
+    pass
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = Clock()
+    monkeypatch.setattr(circuit_breaker.time, "monotonic", fake.monotonic)
+    return fake
+
+
+def make_breaker():
+    return CircuitBreaker(
+        name="test",
+        failure_threshold=2,
+        recovery_timeout=10,
+        half_open_max_calls=1,
+        failure_exceptions=(Outage,)
+    )
+
+
+def call(breaker, result=None, error=None):
+    async def func():
+        if error is not None:
+            raise error
+        return result
+    return asyncio.run(breaker.call(func))
+
+
+def test_opens_after_consecutive_failures_and_rejects(clock):
+    breaker = make_breaker()
+    with pytest.raises(Outage):
+        call(breaker, error=Outage())
+    assert breaker.state == "closed"
+    with pytest.raises(Outage):
+        call(breaker, error=Outage())
+    assert breaker.state == "open" and breaker.is_open
+    with pytest.raises(CircuitOpenError):
+        call(breaker, result=1)
+    assert breaker.stats()["rejected"] == 1
+
+
+def test_other_errors_do_not_count_as_failures(clock):
+    breaker = make_breaker()
+    for _ in range(3):
+        with pytest.raises(ValueError):
+            call(breaker, error=ValueError())
+    assert breaker.state == "closed" and breaker.consecutive_failures == 0
+
+
+def test_half_open_trial_closes_or_reopens(clock):
+    breaker = make_breaker()
+    for _ in range(2):
+        with pytest.raises(Outage):
+            call(breaker, error=Outage())
+    clock.now += 10
+    assert not breaker.is_open
+    with pytest.raises(Outage):
+        call(breaker, error=Outage())
+    assert breaker.state == "open" and breaker.times_opened == 2
+
+    clock.now += 10
+    assert call(breaker, result="ok") == "ok"
+    assert breaker.state == "closed" and breaker.consecutive_failures == 0
+
+
+def test_half_open_limits_trial_calls(clock):
+    breaker = make_breaker()
+    for _ in range(2):
+        with pytest.raises(Outage):
+            call(breaker, error=Outage())
+    clock.now += 10
+
+    async def trial_and_second_call():
+        release = asyncio.Event()
+
+        async def slow():
+            await release.wait()
+            return "ok"
+
+        trial = asyncio.create_task(breaker.call(slow))
+        await asyncio.sleep(0)
+        assert breaker.state == "half_open"
+        with pytest.raises(CircuitOpenError):
+            await breaker.call(slow)
+        release.set()
+        return await trial
+
+    assert asyncio.run(trial_and_second_call()) == "ok"
+    assert breaker.state == "closed"
@@ -0,0 +1,32 @@
+import pytest
+
+for package in ("openai", "fastapi", "PIL", "pydantic_settings", "sqlalchemy", "pymysql"):
+    pytest.importorskip(package)
+
+from src.utils.ocr_openai import _group_crop_sizes, _group_regions  # noqa: E402
+
+SIZES = [(1204, 748), (1204, 748)]
+IDENTIDAD = ("tipo_documento", "numero_documento", "nombres", "apellidos")
+
+
+def test_unknown_type_sends_full_pages():
+    assert _group_regions(None, IDENTIDAD, 2) == {}
+    assert _group_crop_sizes(SIZES, IDENTIDAD) == SIZES
+
+
+def test_passport_identity_crop_includes_number():
+    regions = _group_regions("pasaporte", IDENTIDAD, 2)
+    (x0, y0, x1, y1), fields = regions[0]
+    assert "numero_documento" in fields
+    assert x1 == 1.0 and y0 == 0.0
+
+
+def test_digital_id_physical_fields_use_front():
+    regions = _group_regions("cedula digital", ("estatura", "grupo_sanguineo", "sexo"), 2)
+    assert list(regions) == [0]
+
+
+def test_known_type_crops_are_smaller_than_pages():
+    crop_sizes = _group_crop_sizes(SIZES, ("fecha_nacimiento", "lugar_nacimiento"), "cedula amarilla")
+    assert len(crop_sizes) == 1
+    assert crop_sizes[0][0] * crop_sizes[0][1] < SIZES[1][0] * SIZES[1][1]
@@ -0,0 +1,16 @@
+import importlib
+import pytest
+
+# Sin las dependencias de requirements.txt (y el driver de MySQL) no se puede importar la app
+for package in ("openai", "fastapi", "PIL", "pydantic_settings", "sqlalchemy", "pymysql"):
+    pytest.importorskip(package)
+
+
+@pytest.mark.parametrize("module", [
+    "src.utils.ocr_openai",
+    "src.extractor.pipeline",
+    "app",
+])
+def test_module_imports(module):
+    importlib.import_module(module)
+
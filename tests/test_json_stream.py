@@ -0,0 +1,43 @@
+from src.utils.json_stream import IncrementalJSONParser
+
+
+def feed_chars(parser, text):
+    closed = []
+    for char in text:
+        closed.extend(parser.feed(char))
+    return closed
+
+
+def test_escapes_in_keys_and_values():
+    text = '{"a\\"b": "x\\\\y\\"z", "c": "\\u00e1\\n"}'
+    parser = IncrementalJSONParser()
+    assert feed_chars(parser, text) == [('a"b', 'x\\y"z'), ("c", "á\n")]
+    assert parser.done
+
+
+def test_partial_value_drops_incomplete_unicode_escape():
+    parser = IncrementalJSONParser()
+    parser.feed('{"nombres": "Jos')
+    assert parser.partial_value() == "Jos"
+    parser.feed("\\u00")
+    assert parser.partial_value() == "Jos"
+    parser.feed("e9")
+    assert parser.partial_value() == "José"
+    parser.feed("\\")
+    assert parser.partial_value() == "José"
+
+
+def test_scalars_closed_by_brace_comma_and_whitespace():
+    parser = IncrementalJSONParser()
+    closed = parser.feed('{"a": 1, "b": true\n, "c": null}')
+    assert closed == [("a", 1), ("b", True), ("c", None)]
+    assert parser.done
+    # Lo que llega después del cierre se ignora
+    assert parser.feed(', "d": 2}') == []
+
+
+def test_nested_values_and_preamble():
+    parser = IncrementalJSONParser()
+    closed = feed_chars(parser, '```json\n{"campos": {"x": "}"}, "lista": [1, [2]], "s": "]"}')
+    assert closed == [("campos", {"x": "}"}), ("lista", [1, [2]]), ("s", "]")]
+    assert parser.partial_value() is None
@@ -0,0 +1,48 @@
+import pytest
+
+pytest.importorskip("numpy")
+
+from src.utils.phash import PerceptualIndex, hamming_distance  # noqa: E402
+
+
+def test_find_returns_nearest_within_distance():
+    index = PerceptualIndex(max_entries=100)
+    index.add(0b0000, "a", 0)
+    index.add(0b0111, "b", 0)
+    index.add(0b1111, "c", 0)
+    assert index.find(0b0001, max_distance=1) == ("a", 1)
+    assert index.find(0b1110, max_distance=2) == ("c", 1)
+    assert index.find(0b0011, max_distance=0) is None
+
+
+def test_find_skips_entries_evicted_from_the_index():
+    index = PerceptualIndex(max_entries=2)
+    index.add(0b0000, "old", 0)
+    index.add(0b1100, "b", 0)
+    index.add(0b1111, "c", 0)
+    assert index.find(0b0000, max_distance=1) is None
+    assert index.find(0b0000, max_distance=2) == ("b", 2)
+
+
+def test_find_matches_linear_scan_after_rebuild():
+    hashes = [(i * 2654435761) & 0xFFFF for i in range(300)]
+    index = PerceptualIndex(max_entries=200)
+    for i, value in enumerate(hashes):
+        index.add(value, f"k{i}", 0)
+    live = {f"k{i}": value for i, value in enumerate(hashes)}
+    live = dict(list(live.items())[-200:])
+    for probe in (0, 0x00FF, 0xAAAA, hashes[-1] ^ 0b101):
+        expected = min((hamming_distance(probe, value) for value in live.values()), default=None)
+        found = index.find(probe, max_distance=4)
+        if expected is not None and expected <= 4:
+            assert found is not None and found[1] == expected
+        else:
+            assert found is None
+
+
+def test_content_matches_uses_stored_content_hash():
+    index = PerceptualIndex(max_entries=10)
+    index.add(0b1010, "a", 0b1111_0000)
+    assert index.content_matches("a", 0b1111_0001, max_distance=1)
+    assert not index.content_matches("a", 0b0000_1111, max_distance=1)
+    assert not index.content_matches("missing", 0, max_distance=64)